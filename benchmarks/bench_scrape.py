@@ -0,0 +1,126 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+"""
+Benchmarks of the docstring scraping that dominates package start up.
+
+The classes follow the airspeed velocity (asv) conventions and can also
+be run offline with `benchmarks/run_benchmarks.py`.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        )
+import importlib
+
+from vttools import scrape
+
+
+class ScrapeModule(object):
+    params = ['numpy', 'numpy.fft', 'scipy.signal', 'scipy.ndimage']
+    param_names = ['module']
+    timeout = 600
+
+    def setup(self, module_path):
+        try:
+            importlib.import_module(module_path)
+        except ImportError:
+            # tells asv (and run_benchmarks) to skip this benchmark
+            raise NotImplementedError("{0} is not installed"
+                                      "".format(module_path))
+        scrape.clear_type_caches()
+
+    def time_scrape_module(self, module_path):
+        scrape.scrape_module(module_path)
+
+    def time_scrape_module_defer_source(self, module_path):
+        scrape.scrape_module(module_path, defer_source=True)
+
+
+# (type, description) pairs cycled through to build synthetic docstrings
+_SYNTHETIC_PARAMS = [('array_like', 'Input array.'),
+                     ('int, optional', 'Axis along which to work.'),
+                     ("{'reflect', 'constant', 'nearest'}, optional",
+                      'How to treat the edges.'),
+                     ('float or sequence of floats', 'Standard deviation.'),
+                     ('(N, M) ndarray of float', 'Weights.'),
+                     ('callable f(x, *args)', 'The function to apply.'),
+                     ('dtype, optional', 'Type of the output.'),
+                     ('str', 'Name of the thing.')]
+
+
+def synthetic_function(n_params):
+    """Make a function with `n_params` documented parameters and
+    `n_params` documented return values
+    """
+    lines = ['Synthetic function to benchmark the port definitions', '',
+             'Parameters', '----------']
+    for idx in range(n_params):
+        the_type, desc = _SYNTHETIC_PARAMS[idx % len(_SYNTHETIC_PARAMS)]
+        lines.extend(['p{0} : {1}'.format(idx, the_type),
+                      '    {0}'.format(desc)])
+    lines.extend(['', 'Returns', '-------'])
+    for idx in range(n_params):
+        the_type, desc = _SYNTHETIC_PARAMS[idx % len(_SYNTHETIC_PARAMS)]
+        the_type = the_type.replace(', optional', '')
+        lines.extend(['r{0} : {1}'.format(idx, the_type),
+                      '    {0}'.format(desc)])
+
+    def func(*args, **kwargs):
+        pass
+    func.__doc__ = '\n'.join('    ' + line for line in lines)
+    return func
+
+
+class DefinePorts(object):
+    params = [10, 100, 1000]
+    param_names = ['n_params']
+
+    def setup(self, n_params):
+        self.func = synthetic_function(n_params)
+        self.doc = scrape.docstring_func(self.func)
+
+    def time_docstring_func(self, n_params):
+        scrape.docstring_func(self.func)
+
+    def time_define_input_ports(self, n_params):
+        # start cold, the memoized helpers would otherwise hide the
+        # parsing after the first repeat
+        scrape.clear_type_caches()
+        scrape.define_input_ports(self.doc, self.func)
+
+    def time_define_output_ports(self, n_params):
+        scrape.clear_type_caches()
+        scrape.define_output_ports(self.doc)
+
+    def time_define_input_ports_warm(self, n_params):
+        scrape.define_input_ports(self.doc, self.func)
@@ -0,0 +1,80 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+"""
+Benchmarks of the generation of VisTrails module classes.
+
+These need VisTrails to be importable and are skipped otherwise.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        )
+import importlib
+
+from vttools import scrape
+
+
+class GenModule(object):
+    params = ['numpy.convolve', 'numpy.add', 'scipy.ndimage.gaussian_filter']
+    param_names = ['function']
+
+    def setup(self, function):
+        try:
+            from vttools import wrap_lib
+        except ImportError:
+            raise NotImplementedError("VisTrails is not installed")
+        module_path, func_name = function.rsplit('.', 1)
+        try:
+            self.spec = scrape.scrape_function(func_name, module_path)
+        except ImportError:
+            raise NotImplementedError("{0} is not installed"
+                                      "".format(module_path))
+        except scrape.AutowrapError:
+            # the installed version has a docstring we can not wrap
+            raise NotImplementedError("{0} can not be scraped"
+                                      "".format(function))
+        self.func = getattr(importlib.import_module(module_path), func_name)
+        self.wrap_lib = wrap_lib
+
+    def time_wrap_function(self, function):
+        self.wrap_lib.wrap_function(**self.spec)
+
+    def time_gen_module(self, function):
+        # gen_module or gen_module_ufunc
+        gen_module = self.wrap_lib._GEN_MOD_LOOKUP[self.spec['f_type']]
+        gen_module(input_ports=self.spec['input_ports'],
+                   output_ports=self.spec['output_ports'],
+                   docstring=self.spec['doc_string'],
+                   module_name=self.spec['func_name'],
+                   library_func=self.func,
+                   module_namespace='bench')
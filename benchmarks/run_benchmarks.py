@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+"""
+Standalone runner for the asv style benchmarks in this directory.
+
+Runs offline against the installed libraries, writes the results to
+``<results-dir>/<commit>.json`` and compares them with the most recent
+result of another commit:
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py -k DefinePorts --repeat 5
+"""
+from __future__ import (absolute_import, division, print_function,
+                        )
+import six
+import argparse
+import datetime
+import glob
+import importlib
+import inspect
+import itertools
+import json
+import os
+import subprocess
+import sys
+import timeit
+
+_BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+_RESULTS_DIR = os.path.join(_BENCH_DIR, 'results')
+
+
+def git_commit():
+    """The commit hash of the source tree (with a '+' if it is dirty)
+    """
+    devnull = open(os.devnull, 'w')
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                         cwd=_BENCH_DIR,
+                                         stderr=devnull).decode().strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'],
+                                cwd=_BENCH_DIR, stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    finally:
+        devnull.close()
+    return commit + ('+' if dirty else '')
+
+
+def find_benchmarks():
+    """Yield (name, class, method name) of every benchmark
+    """
+    sys.path.insert(0, os.path.dirname(_BENCH_DIR))
+    for fname in sorted(glob.glob(os.path.join(_BENCH_DIR, 'bench_*.py'))):
+        mod_name = os.path.splitext(os.path.basename(fname))[0]
+        mod = importlib.import_module('benchmarks.' + mod_name)
+        for cls_name, cls in sorted(vars(mod).items()):
+            if not inspect.isclass(cls) or cls.__module__ != mod.__name__:
+                continue
+            for meth_name in sorted(dir(cls)):
+                if meth_name.startswith('time_'):
+                    yield ('{0}.{1}.{2}'.format(mod_name, cls_name,
+                                                meth_name),
+                           cls, meth_name)
+
+
+def param_sets(cls):
+    """The parameter combinations of a benchmark class, asv style
+    """
+    params = getattr(cls, 'params', None)
+    if not params:
+        return [()]
+    if not isinstance(params[0], list):
+        params = [params]
+    return list(itertools.product(*params))
+
+
+def run_benchmark(cls, meth_name, params, repeat):
+    """Best time of `repeat` runs, or None if the benchmark is skipped
+    """
+    bench = cls()
+    if hasattr(bench, 'setup'):
+        try:
+            bench.setup(*params)
+        except NotImplementedError:
+            return None
+    try:
+        meth = getattr(bench, meth_name)
+        return min(timeit.repeat(lambda: meth(*params), number=1,
+                                 repeat=repeat))
+    finally:
+        if hasattr(bench, 'teardown'):
+            bench.teardown(*params)
+
+
+def previous_results(results_dir, commit):
+    """The most recent stored results of a different commit, or None
+    """
+    results = []
+    for fname in glob.glob(os.path.join(results_dir, '*.json')):
+        with open(fname) as f:
+            res = json.load(f)
+        if res['commit'] != commit:
+            results.append(res)
+    if not results:
+        return None
+    return max(results, key=lambda res: res['date'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-k', dest='keyword', default='',
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs per benchmark, the best one '
+                             'is kept (default: %(default)s)')
+    parser.add_argument('--results-dir', default=_RESULTS_DIR,
+                        help='where to store the results '
+                             '(default: %(default)s)')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='slow down ratio flagged as a regression '
+                             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    times = {}
+    for name, cls, meth_name in find_benchmarks():
+        if args.keyword not in name:
+            continue
+        for params in param_sets(cls):
+            full_name = '{0}({1})'.format(name, ', '.join(repr(p)
+                                                          for p in params))
+            times[full_name] = run_benchmark(cls, meth_name, params,
+                                             args.repeat)
+            if times[full_name] is None:
+                print('{0:>10}  {1}'.format('skipped', full_name))
+            else:
+                print('{0:9.4f}s  {1}'.format(times[full_name], full_name))
+
+    previous = previous_results(args.results_dir, commit)
+    if not os.path.isdir(args.results_dir):
+        os.makedirs(args.results_dir)
+    with open(os.path.join(args.results_dir,
+                           commit.replace('+', '-dirty') + '.json'),
+              'w') as f:
+        json.dump({'commit': commit,
+                   'date': datetime.datetime.utcnow().isoformat(),
+                   'python': sys.version.split()[0],
+                   'times': times}, f, indent=1, sort_keys=True)
+
+    if previous is None:
+        return 0
+    print('\ncompared to {0}:'.format(previous['commit']))
+    regressions = 0
+    for full_name, seconds in sorted(six.iteritems(times)):
+        before = previous['times'].get(full_name)
+        if seconds is None or not before:
+            continue
+        ratio = seconds / before
+        flag = ''
+        if ratio > args.threshold:
+            flag = '  <-- REGRESSION'
+            regressions += 1
+        print('{0:6.2f}x  {1}{2}'.format(ratio, full_name, flag))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
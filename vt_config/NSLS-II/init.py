@@ -43,8 +43,10 @@ import logging
 import traceback
 import importlib
 import collections
+import atexit
+import os
 
-from vttools import wrap_lib, scrape
+from vttools import wrap_lib, scrape, manifest, profiling
 from vttools.vtmods.import_lists import load_config
 
 # unrelated so commented out
@@ -54,26 +56,40 @@ logger = logging.getLogger(__name__)
 # get modules to import
 import_dict = load_config()
 
-_black_list = ['who', 'mafromtxt', 'ndfromtxt', 'source',
-                 'info', 'add_newdoc_ufunc', 'frombuffer',
-                 'fromiter', 'frompyfunc', 'getbuffer',
-                 'newbuffer', 'pkgload', 'recfromcsv',
-                 'recfromtxt', 'savez', 'savez_compressed',
-                 'set_printoptions', 'seterrcall', 'tensordot',
-                 'genfromtxt', 'ppmt', 'pv', 'rate', 'nper', 'fv',
-                 'ipmt', 'issubclass_', 'pmt', 'formatter',
-                 # skxray
-                 'peak_refinement']
+# cache the scraped specs on disk so that warm starts skip the
+# docstring parsing.  Set to None to always scrape from scratch.
+_spec_cache_dir = scrape.SPEC_CACHE_DIR
 
-_exclude_markers = ['busday', 'buffer']
+# number of worker processes used to scrape the 'autowrap_module'
+# entries.  1 scrapes serially in the VisTrails process, set a larger
+# number (or None for one per CPU) to scrape in parallel
+_scrape_processes = 1
+
+# prebuilt spec manifest (see `vttools.manifest`).  If the file exists
+# the functions are wrapped straight from it instead of being scraped
+_manifest_path = os.environ.get('VTTOOLS_MANIFEST', manifest.MANIFEST_PATH)
+
+# if set, the per module/function startup timings are written there as
+# JSON (see `vttools.profiling`)
+_startup_report_path = os.environ.get('VTTOOLS_STARTUP_REPORT')
+
+# if set, the execution of the autowrapped modules is profiled and the
+# numbers are written there as JSON when VisTrails exits
+_execution_report_path = os.environ.get('VTTOOLS_EXECUTION_REPORT')
+
+# extra keyword arguments of `wrap_lib.wrap_function` applied to every
+# autowrapped function.  'cache_results' reuses the results of upstream
+# functions whose inputs did not change (see `vttools.result_cache`)
+_wrap_kwargs = {'cache_results': False}
 
 
 def get_modules():
 
-    # autowrap classes
-    # class_list = import_dict['autowrap_classes']
-    # vtclasses = [wrap_lib.wrap_function(**func_dict)
-    #              for func_dict in class_list]
+    if _execution_report_path:
+        # must be on before the modules are generated
+        profiling.enable_execution_profiling()
+        atexit.register(profiling.dump_execution_report,
+                        _execution_report_path)
 
     # import the hand-built VisTrails modules
     module_list = import_dict['import_modules']
@@ -83,65 +99,68 @@ def get_modules():
 
     vtmods = [vtmod for mod in pymods for vtmod in mod.vistrails_modules()]
 
-    vtfuncs = []
-    mod_targets = ['numpy',
-                   'numpy.fft',
-                   'numpy.polynomial',
-                   'numpy.random',
-                   'scipy',
-                   'scipy.cluster',
-                   'scipy.fftpack',
-                   'scipy.integrate',
-                   'scipy.interpolate',
-                   'scipy.io',
-                   'scipy.linalg',
-                   'scipy.misc',
-                   'scipy.ndimage',
-                   'scipy.odr',
-                   'scipy.optimize',
-                   'scipy.signal',
-                   'scipy.sparse',
-                   'scipy.spatial',
-                   'scipy.special',
-                   'scipy.stats',
-                   'skxray.core.arithmetic',
-                   'skxray.core.calibration',
-                   'skxray.core.correlation',
-                   'skxray.core.utils',
-                   'skxray.core.recip',
-                   'skxray.core.roi',
-                   'skxray.io.binary',
-                   'skxray.io.save_powder_output',
-                   'skxray.io.gsas_file_reader',
-                   'skxray.diffraction',
-                   'vttools.to_wrap.fitting',
-                   #'vttools.to_wrap.image.filtering',
-                   #'vttools.to_wrap.image.histogram',
-                   #'vttools.to_wrap.image.logic',
-                   #'vttools.to_wrap.image.math',
-                   #'vttools.to_wrap.image.morphology',
-                   #'vttools.to_wrap.image.registration',
-                   #'vttools.to_wrap.image.thresholding',
-                   #'vttools.to_wrap.image.transformation',
-				   'tomopy',
-                   ]
-
-    for mod_name in mod_targets:
+    # autowrap classes
+    vtmods += _wrap_classes(import_dict.get('autowrap_class') or [])
+
+    if _manifest_path and os.path.exists(_manifest_path):
         print('=' * 25)
-        print('starting module {}'.format(mod_name))
+        print('loading manifest {}'.format(_manifest_path))
         print('=' * 25)
-        mod_specs = scrape.scrape_module(mod_name,
-                                         black_list=_black_list,
-                                         exclude_markers=_exclude_markers)
-        for ftw, spec_dict in six.iteritems(mod_specs):
-            try:
-                tmp = wrap_lib.wrap_function(**spec_dict)
-                vtfuncs.append(tmp)
-            except Exception as e:
-                logger.warn("%s failed wrapping on %s.%s",
-                        e, mod_name, ftw)
-
-    all_mods = vtmods + vtfuncs
+        entries = manifest.read_manifest(_manifest_path)
+    else:
+        # the same entries as a manifest built from modules.yaml
+        entries = manifest.autowrap_entries(import_dict,
+                                            processes=_scrape_processes,
+                                            cache_dir=_spec_cache_dir,
+                                            # only read the function source
+                                            # when the documentation is
+                                            # opened
+                                            defer_source=True)
+
+    return _finalize_modules(vtmods + _wrap_entries(entries))
+
+
+def _wrap_classes(class_list):
+    """Wrap the classes listed under 'autowrap_class' in modules.yaml
+    """
+    vtclasses = []
+    for class_dict in class_list:
+        try:
+            vtclasses.extend(wrap_lib.wrap_class(**class_dict))
+        except Exception as e:
+            logger.warn("%s failed wrapping class %s.%s",
+                        e, class_dict.get('module_path'),
+                        class_dict.get('class_name'))
+    return vtclasses
+
+
+def _wrap_entries(entries):
+    """Wrap the functions of `manifest.autowrap_entries` or of a manifest
+    """
+    vtfuncs = []
+    mod_name = None
+    for spec_dict in entries:
+        if spec_dict['module_path'] != mod_name:
+            mod_name = spec_dict['module_path']
+            print('=' * 25)
+            print('starting module {}'.format(mod_name))
+            print('=' * 25)
+        try:
+            vtfuncs.append(wrap_lib.wrap_function(**dict(spec_dict,
+                                                         **_wrap_kwargs)))
+        except Exception as e:
+            logger.warn("%s failed wrapping on %s.%s",
+                        e, mod_name, spec_dict['func_name'])
+    return vtfuncs
+
+
+def _finalize_modules(all_mods):
+    """Report the startup timings and check that no module is duplicated
+    """
+    profiling.log_startup_summary()
+    if _startup_report_path:
+        profiling.dump_startup_report(_startup_report_path)
+
     if len(all_mods) != len(set(all_mods)):
         raise ValueError('Some modules have been imported multiple times.\n'
                          'Full list: {0}'
@@ -0,0 +1,413 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+"""
+Persistent index of the file names under a directory tree.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        )
+import six
+from six.moves import cPickle as pickle
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from .utils import dump_pickle
+
+logger = logging.getLogger(__name__)
+
+# default location of the on-disk file indices
+FILE_INDEX_DIR = os.path.join(os.path.expanduser('~'), '.vttools',
+                              'file_index')
+# seconds a refresh of an index is trusted for by `FileIndex.lookup`
+_REFRESH_AGE = 60.
+# bump this when the layout of the stored index changes so that indices
+# written by older versions of vttools are rebuilt
+_FILE_INDEX_FORMAT = 2
+
+
+class FileIndex(object):
+    """
+    Index of the file names found under `root`
+
+    The index records the mtime, the sub-directories and the file names
+    of every directory in the tree.  Looking up a file name is a dict
+    lookup.  `refresh` only stats the directories and lists the ones whose
+    mtime changed (a file was added, removed or renamed in them), which
+    is much cheaper than walking the whole tree again.
+
+    Parameters
+    ----------
+    root : str
+        Top of the indexed tree, '~' is expanded
+
+    index_dir : str or None, optional
+        Directory the index is stored in, defaults to FILE_INDEX_DIR.
+        None keeps the index in memory only.  It is left out of the index
+        when it is under `root`, storing the index would otherwise change
+        it on every refresh
+
+    Examples
+    --------
+    >>> index = FileIndex('~')
+    >>> index.refresh()
+    >>> index.find('sample.tif')
+    ['/home/user/Demos/sample.tif']
+    """
+    def __init__(self, root, index_dir=FILE_INDEX_DIR):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.index_dir = index_dir
+        # dir path -> (mtime, sub-directory paths, file names)
+        self._dirs = {}
+        # file name -> set of the dir paths holding a file of that name
+        self._names = {}
+        # time.time() of the last build or refresh, None for an index
+        # that was only loaded
+        self.refreshed = None
+        self._lock = threading.RLock()
+
+    @property
+    def index_file(self):
+        """Path of the stored index, None for in-memory indices"""
+        if self.index_dir is None:
+            return None
+        root = self.root
+        if isinstance(root, six.text_type):
+            root = root.encode('utf-8')
+        return os.path.join(self.index_dir,
+                            hashlib.sha1(root).hexdigest() + _FILE_INDEX_EXT)
+
+    def __len__(self):
+        return len(self._dirs)
+
+    def find(self, file_name):
+        """Paths of the files named `file_name`
+
+        The answer is as fresh as the last `build` or `refresh`.
+
+        Parameters
+        ----------
+        file_name : str
+            Name and extension of the file, without any directory
+
+        Returns
+        -------
+        paths : list
+            Sorted full paths of the matching files
+        """
+        with self._lock:
+            dirs = self._names.get(file_name, ())
+            return sorted(os.path.join(d, file_name) for d in dirs)
+
+    def lookup(self, file_name, max_age=_REFRESH_AGE):
+        """Paths of the files named `file_name`, refreshing when needed
+
+        Unlike `find`, the index is refreshed first if it was not
+        refreshed in the last `max_age` seconds, and again if the lookup
+        misses or finds a file that is gone.
+
+        Parameters
+        ----------
+        file_name : str
+            Name and extension of the file, without any directory
+
+        max_age : float, optional
+            Seconds a refresh is trusted for
+
+        Returns
+        -------
+        paths : list
+            Sorted full paths of the matching files
+        """
+        refreshed = self.refreshed
+        if refreshed is None or time.time() - refreshed >= max_age:
+            self.refresh()
+            return self.find(file_name)
+        paths = self.find(file_name)
+        if not paths or not all(os.path.exists(path) for path in paths):
+            self.refresh()
+            paths = self.find(file_name)
+        return paths
+
+    def build(self):
+        """Index the whole tree from scratch and store the index
+
+        Returns
+        -------
+        stats : dict
+            See `refresh`
+        """
+        with self._lock:
+            self._dirs.clear()
+            self._names.clear()
+            return self.refresh()
+
+    def refresh(self):
+        """Bring the index up to date and store it if anything changed
+
+        Every indexed directory is stat'ed, only the new directories and
+        those whose mtime changed are listed again.
+
+        Returns
+        -------
+        stats : dict
+            'dirs' in the tree, how many were 'rescanned' and the
+            'seconds' it took
+        """
+        start = time.time()
+        rescanned = 0
+        with self._lock:
+            stack = [self.root]
+            seen = 0
+            while stack:
+                path = stack.pop()
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    # removed since its parent was listed
+                    self._drop(path)
+                    continue
+                entry = self._dirs.get(path)
+                if entry is None or entry[0] != mtime:
+                    entry = self._rescan(path, mtime, start)
+                    rescanned += 1
+                seen += 1
+                stack.extend(entry[1])
+            if rescanned:
+                self.save()
+            self.refreshed = time.time()
+        stats = {'dirs': seen, 'rescanned': rescanned,
+                 'seconds': time.time() - start}
+        logger.debug('refreshed the file index of %s: %s', self.root, stats)
+        return stats
+
+    def _rescan(self, path, mtime, now):
+        """List `path` again and update its entry in the index
+        """
+        subdirs, files = _list_dir(path)
+        if self.index_dir is not None:
+            index_dir = os.path.abspath(self.index_dir)
+            subdirs = [subdir for subdir in subdirs if subdir != index_dir]
+        if now - mtime < _MTIME_RESOLUTION:
+            # the directory may change again within the mtime resolution,
+            # do not trust this mtime on the next refresh
+            mtime = None
+        old = self._dirs.get(path)
+        if old is not None:
+            for name in old[2]:
+                self._unindex(name, path)
+            for subdir in set(old[1]).difference(subdirs):
+                self._drop(subdir)
+        for name in files:
+            self._names.setdefault(name, set()).add(path)
+        entry = (mtime, subdirs, files)
+        self._dirs[path] = entry
+        return entry
+
+    def _drop(self, path):
+        """Remove `path` and everything under it from the index
+        """
+        stack = [path]
+        while stack:
+            dir_path = stack.pop()
+            entry = self._dirs.pop(dir_path, None)
+            if entry is None:
+                continue
+            for name in entry[2]:
+                self._unindex(name, dir_path)
+            stack.extend(entry[1])
+
+    def _unindex(self, name, path):
+        dirs = self._names.get(name)
+        if dirs is None:
+            return
+        dirs.discard(path)
+        if not dirs:
+            del self._names[name]
+
+    def load(self):
+        """Read the stored index
+
+        Returns
+        -------
+        loaded : bool
+            False if there is no (readable, current) stored index
+        """
+        index_file = self.index_file
+        if index_file is None or not os.path.exists(index_file):
+            return False
+        try:
+            with open(index_file, 'rb') as f:
+                stored = pickle.load(f)
+        except Exception as e:
+            # a corrupt index is never fatal, it is just rebuilt
+            logger.warning("could not read file index %s: %s", index_file, e)
+            return False
+        if (stored.get('format') != _FILE_INDEX_FORMAT or
+                stored.get('root') != self.root):
+            logger.debug("file index %s is out of date", index_file)
+            return False
+        with self._lock:
+            self._dirs = stored['dirs']
+            self._names = {}
+            for path, (_, _, files) in six.iteritems(self._dirs):
+                for name in files:
+                    self._names.setdefault(name, set()).add(path)
+        return True
+
+    def save(self):
+        """Store the index in `index_dir`
+        """
+        index_file = self.index_file
+        if index_file is None:
+            return
+        try:
+            with self._lock:
+                # the names are rebuilt from the dirs on load
+                dump_pickle({'format': _FILE_INDEX_FORMAT,
+                             'root': self.root,
+                             'dirs': self._dirs}, index_file)
+        except Exception as e:
+            logger.warning("could not write file index %s: %s",
+                           index_file, e)
+
+
+def _list_dir(path):
+    """Sub-directory paths and file names in `path`
+
+    Symbolic links to directories are not followed, like `os.walk`.
+    Unreadable directories are indexed as empty.
+    """
+    try:
+        names = os.listdir(path)
+    except OSError as e:
+        logger.debug('can not list %s: %s', path, e)
+        return [], []
+    subdirs = []
+    files = []
+    for name in names:
+        full = os.path.join(path, name)
+        if os.path.isdir(full):
+            if not os.path.islink(full):
+                subdirs.append(full)
+        else:
+            files.append(name)
+    return subdirs, files
+
+
+def get_file_index(root, index_dir=FILE_INDEX_DIR):
+    """The index of `root`, shared within the process
+
+    The first call loads the stored index, or builds it if there is
+    none.  The index is not refreshed, call `FileIndex.refresh` for that
+    or look files up with `FileIndex.lookup`.
+
+    Parameters
+    ----------
+    root : str
+        Top of the indexed tree, '~' is expanded
+
+    index_dir : str or None, optional
+        Directory the index is stored in, defaults to FILE_INDEX_DIR
+
+    Returns
+    -------
+    index : FileIndex
+    """
+    index = FileIndex(root, index_dir=index_dir)
+    key = (index.root, index_dir)
+    with _INDICES_LOCK:
+        if key in _INDICES:
+            return _INDICES[key]
+        if not index.load():
+            logger.info('building the file index of %s', index.root)
+            index.build()
+        _INDICES[key] = index
+    return index
+
+
+def build_file_index(root, index_dir=FILE_INDEX_DIR, rebuild=False):
+    """Create or update the stored index of `root`
+
+    Parameters
+    ----------
+    root : str
+        Top of the indexed tree, '~' is expanded
+
+    index_dir : str, optional
+        Directory the index is stored in, defaults to FILE_INDEX_DIR
+
+    rebuild : bool, optional
+        Index the whole tree from scratch instead of refreshing the
+        stored index
+
+    Returns
+    -------
+    stats : dict
+        See `FileIndex.refresh`
+    """
+    if rebuild:
+        index = FileIndex(root, index_dir=index_dir)
+        with _INDICES_LOCK:
+            index = _INDICES.setdefault((index.root, index_dir), index)
+        return index.build()
+    return get_file_index(root, index_dir=index_dir).refresh()
+
+
+def clear_file_index(index_dir=FILE_INDEX_DIR):
+    """Remove all of the stored file indices from `index_dir`
+
+    Parameters
+    ----------
+    index_dir : str, optional
+        Directory the indices are stored in, defaults to FILE_INDEX_DIR
+    """
+    with _INDICES_LOCK:
+        for key in [key for key in _INDICES if key[1] == index_dir]:
+            del _INDICES[key]
+    if not os.path.isdir(index_dir):
+        return
+    for fname in os.listdir(index_dir):
+        if fname.endswith(_FILE_INDEX_EXT):
+            os.remove(os.path.join(index_dir, fname))
+
+
+_FILE_INDEX_EXT = '.pkl'
+# directories modified this recently (in seconds) are listed again on the
+# next refresh, their mtime may not have ticked yet
+_MTIME_RESOLUTION = 2.0
+_INDICES = {}
+_INDICES_LOCK = threading.Lock()
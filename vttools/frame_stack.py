@@ -0,0 +1,262 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+"""
+Lazy access to image series stored one frame per file.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        )
+import six
+import logging
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import tifffile
+from tifffile import imread
+
+from .image_io import memmap_tiff
+
+logger = logging.getLogger(__name__)
+
+
+class LazyFrameStack(object):
+    """
+    A series of TIFF or NPY files, one frame per file, read on demand
+
+    Creating the stack only reads the header of the first file, to learn
+    the shape and dtype of the frames.  A frame is read when it is indexed.
+    If possible, it is memory mapped (uncompressed TIFF, .npy). Otherwise
+    it is decoded and kept in a least recently used cache bounded to
+    `cache_bytes`, so viewers and per-frame functions can walk through
+    thousand frame series with bounded memory.
+
+    Parameters
+    ----------
+    files : list
+        Paths of the frame files (.tif, .tiff or .npy), all holding frames
+        of the same shape and dtype
+
+    cache_bytes : int, optional
+        Budget of the decoded frame cache.  Defaults to 256 MB
+
+    memmap : bool, optional
+        Memory map the frames when possible (the default) instead of
+        decoding them into the cache
+
+    Examples
+    --------
+    >>> stack = LazyFrameStack(sorted(glob.glob('scan/*.tif')))
+    >>> stack.shape
+    (3000, 2048, 2048)
+    >>> roi = stack[1500][100:200, 100:200]
+    """
+    def __init__(self, files, cache_bytes=256 * 2 ** 20, memmap=True):
+        self.files = list(files)
+        if not self.files:
+            raise ValueError('There are no files in the stack')
+        for fname in self.files:
+            if _frame_kind(fname) is None:
+                raise ValueError('Unsupported frame file {0}'.format(fname))
+        self.cache_bytes = cache_bytes
+        self.memmap = memmap
+        self._frame_shape, self.dtype = _probe_frame(self.files[0])
+        self._cache = OrderedDict()
+        self._cache_stats = {'hits': 0, 'misses': 0, 'nbytes': 0}
+        # files known to be compressed, not worth trying to map again
+        self._unmappable = set()
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return (len(self.files), ) + self._frame_shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __getitem__(self, key):
+        """Frame(s) of the stack
+
+        An integer gives one frame, a slice or a list of integers a 3-D
+        ndarray of frames.  Extra indices apply to the frames, so
+        ``stack[10, :, 5]`` only maps or decodes frame 10.
+        """
+        if isinstance(key, tuple):
+            frames = self[key[0]]
+            if isinstance(key[0], six.integer_types + (np.integer, )):
+                return frames[key[1:]]
+            return frames[(slice(None), ) + key[1:]]
+        if isinstance(key, slice):
+            return self._stack(range(*key.indices(len(self))))
+        if isinstance(key, (list, np.ndarray)):
+            return self._stack(key)
+        idx = int(key)
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('frame {0} out of range for a stack of {1}'
+                             ''.format(key, len(self)))
+        return self._frame(idx)
+
+    def __array__(self, dtype=None):
+        # reads all of the frames
+        arr = self[:]
+        if dtype is not None:
+            arr = arr.astype(dtype, copy=False)
+        return arr
+
+    def __repr__(self):
+        return 'LazyFrameStack(shape={0}, dtype={1})'.format(self.shape,
+                                                            self.dtype)
+
+    def _stack(self, indices):
+        indices = list(indices)
+        out = np.empty((len(indices), ) + self._frame_shape, dtype=self.dtype)
+        for pos, idx in enumerate(indices):
+            out[pos] = self[idx]
+        return out
+
+    def _frame(self, idx):
+        with self._lock:
+            frame = self._cache.pop(idx, None)
+            if frame is not None:
+                self._cache_stats['hits'] += 1
+                # re-insert as the most recently used
+                self._cache[idx] = frame
+                return frame
+
+        fname = self.files[idx]
+        frame = None
+        if self.memmap and idx not in self._unmappable:
+            frame = _memmap_frame(fname)
+            if frame is None:
+                self._unmappable.add(idx)
+        if frame is None:
+            frame = _read_frame(fname)
+            mapped = False
+        else:
+            mapped = True
+        if frame.shape != self._frame_shape or frame.dtype != self.dtype:
+            raise ValueError('{0} is a {1} {2} frame, the stack is {3} {4}'
+                             ''.format(fname, frame.shape, frame.dtype,
+                                       self._frame_shape, self.dtype))
+        if mapped:
+            # re-mapping is cheap, only decoded frames are cached
+            return frame
+
+        with self._lock:
+            self._cache_stats['misses'] += 1
+            if frame.nbytes <= self.cache_bytes:
+                old = self._cache.pop(idx, None)
+                if old is not None:
+                    self._cache_stats['nbytes'] -= old.nbytes
+                self._cache[idx] = frame
+                self._cache_stats['nbytes'] += frame.nbytes
+                while self._cache_stats['nbytes'] > self.cache_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cache_stats['nbytes'] -= evicted.nbytes
+        return frame
+
+    def cache_info(self):
+        """Statistics of the decoded frame cache
+
+        Returns
+        -------
+        info : dict
+            'hits', 'misses', the number of cached frames ('size'), their
+            'nbytes' and the 'max_bytes' budget
+        """
+        with self._lock:
+            return dict(self._cache_stats, size=len(self._cache),
+                        max_bytes=self.cache_bytes)
+
+    def clear_cache(self):
+        """Drop the cached frames
+        """
+        with self._lock:
+            self._cache.clear()
+            self._cache_stats['nbytes'] = 0
+            self._cache_stats['hits'] = 0
+            self._cache_stats['misses'] = 0
+
+
+def _frame_kind(fname):
+    """'tiff', 'npy' or None for the unsupported files
+    """
+    return _FRAME_KINDS.get(os.path.splitext(fname)[1].lower())
+
+
+def _probe_frame(fname):
+    """Shape and dtype of a frame file, from its header only
+    """
+    if _frame_kind(fname) == 'npy':
+        arr = np.load(fname, mmap_mode='r')
+        return arr.shape, arr.dtype
+    tif = tifffile.TiffFile(fname)
+    try:
+        if len(tif.pages) == 1:
+            page = tif.pages[0]
+            return tuple(page.shape), np.dtype(page.dtype)
+    finally:
+        tif.close()
+    # multi-page files are read once to get the stacked shape
+    arr = imread(fname)
+    return arr.shape, arr.dtype
+
+
+def _memmap_frame(fname):
+    """Memory mapped frame, None if the file can not be memory mapped
+    """
+    if _frame_kind(fname) == 'npy':
+        return np.load(fname, mmap_mode='r')
+    return memmap_tiff(fname)
+
+
+def _read_frame(fname):
+    """Decode a frame file
+    """
+    if _frame_kind(fname) == 'npy':
+        return np.load(fname)
+    return imread(fname)
+
+
+_FRAME_KINDS = {'.tif': 'tiff', '.tiff': 'tiff', '.npy': 'npy'}
@@ -0,0 +1,293 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+"""
+Fusion of chains of ufuncs.
+
+A pipeline such as ``log((frame - dark) / flat) * scale`` built from
+wrapped ufunc modules allocates a full size temporary array at every
+step.  `FusedUfunc` evaluates such a chain as one expression instead:
+through numexpr when it is installed and the expression can be written
+for it, otherwise block by block along the leading axis so that the
+intermediate results only ever exist for one cache-sized block.
+
+`find_ufunc_chains` finds the fusable chains in a workflow graph and
+`wrap_lib.fuse_ufunc_modules` generates the VisTrails module of a chain.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        )
+import six
+import logging
+import numpy as np
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+logger = logging.getLogger(__name__)
+
+
+class FusedUfunc(object):
+    """
+    A chain of single output ufuncs evaluated as one expression
+
+    Parameters
+    ----------
+    steps : list
+        (ufunc, operands) of each step, in evaluation order.  An operand
+        is either the name of an input (str) or the index of an earlier
+        step (int) whose result it takes.  The result of the last step is
+        the result of the chain.
+
+    use_numexpr : bool, optional
+        Evaluate through numexpr when it is installed, the expression
+        only uses functions numexpr knows about and all the inputs are
+        floating point arrays (numexpr differs from numpy on integer
+        arithmetic).  Defaults to True
+
+    Examples
+    --------
+    >>> normalize = FusedUfunc([(np.subtract, ('frame', 'dark')),
+    ...                         (np.divide, (0, 'flat')),
+    ...                         (np.log, (1, ))])
+    >>> normalize(frame=frame, dark=dark, flat=flat)
+    """
+    def __init__(self, steps, use_numexpr=True):
+        self.steps = []
+        self.input_names = []
+        for idx, (ufunc, operands) in enumerate(steps):
+            if not isinstance(ufunc, np.ufunc):
+                raise TypeError('{0!r} is not a ufunc'.format(ufunc))
+            if ufunc.nout != 1:
+                raise ValueError('Can not fuse {0}, it has {1} outputs'
+                                 ''.format(ufunc.__name__, ufunc.nout))
+            if len(operands) != ufunc.nin:
+                raise ValueError('{0} takes {1} inputs, got {2}'
+                                 ''.format(ufunc.__name__, ufunc.nin,
+                                           len(operands)))
+            for op in operands:
+                if isinstance(op, six.string_types):
+                    if op not in self.input_names:
+                        self.input_names.append(op)
+                elif not 0 <= op < idx:
+                    raise ValueError('Step {0} can only use the result of '
+                                     'an earlier step, not {1}'
+                                     ''.format(idx, op))
+            self.steps.append((ufunc, tuple(operands)))
+        if not self.steps:
+            raise ValueError('There is nothing to fuse')
+        self.expression = _numexpr_expression(self.steps)
+        self.use_numexpr = (use_numexpr and numexpr is not None and
+                            self.expression is not None)
+
+    def __call__(self, **inputs):
+        """Evaluate the chain
+
+        Parameters
+        ----------
+        inputs
+            Value of each input, keyed on input name
+
+        Returns
+        -------
+        result : ndarray or scalar
+        """
+        missing = set(self.input_names) - set(inputs)
+        if missing:
+            raise TypeError('Missing inputs {0}'.format(sorted(missing)))
+        arrays = dict((name, np.asarray(inputs[name]))
+                      for name in self.input_names)
+        if self.use_numexpr and all(arr.dtype.kind in 'fc'
+                                    for arr in six.itervalues(arrays)):
+            return numexpr.evaluate(self.expression, local_dict=arrays)
+
+        bcast = np.broadcast(*arrays.values())
+        shape = bcast.shape
+        if bcast.size < _FUSE_MIN_SIZE or shape[0] < 2:
+            return self._evaluate(arrays)
+
+        itemsize = max(arr.itemsize for arr in six.itervalues(arrays))
+        rows = max(1, _BLOCK_BYTES // (bcast.size // shape[0] * itemsize))
+        out = None
+        for start in range(0, shape[0], rows):
+            stop = min(start + rows, shape[0])
+            block = dict((name, arr[start:stop]
+                          if arr.ndim == len(shape) and
+                          arr.shape[0] == shape[0] else arr)
+                         for name, arr in six.iteritems(arrays))
+            if out is None:
+                # the first block tells the type of the result
+                first = self._evaluate(block)
+                out = np.empty(shape, dtype=first.dtype)
+                out[start:stop] = first
+            else:
+                self._evaluate(block, out=out[start:stop])
+        return out
+
+    def _evaluate(self, arrays, out=None):
+        """Run the steps on `arrays`, the last one writing into `out`
+        """
+        results = []
+        last = len(self.steps) - 1
+        for idx, (ufunc, operands) in enumerate(self.steps):
+            args = [arrays[op] if isinstance(op, six.string_types)
+                    else results[op] for op in operands]
+            if idx == last and out is not None:
+                results.append(ufunc(*args, out=out))
+            else:
+                results.append(ufunc(*args))
+        return results[-1]
+
+    def __repr__(self):
+        return 'FusedUfunc({0})'.format(
+            self.expression or ', '.join(ufunc.__name__
+                                         for ufunc, _ in self.steps))
+
+
+def _numexpr_expression(steps):
+    """The numexpr expression of a chain, None if it can not be written
+    """
+    terms = []
+    for ufunc, operands in steps:
+        template = _NUMEXPR_TEMPLATES.get(ufunc.__name__)
+        if template is None:
+            return None
+        terms.append(template.format(*[
+            op if isinstance(op, six.string_types) else terms[op]
+            for op in operands]))
+    return terms[-1]
+
+
+def find_ufunc_chains(ufuncs, edges):
+    """Find the chains of ufunc nodes of a graph that can be fused
+
+    A chain is a path of ufunc nodes where each node but the last feeds
+    only the next one, so that its result is not needed anywhere else.
+    A node fed by several such nodes starts its own chain, so the chains
+    never share a node.
+
+    Parameters
+    ----------
+    ufuncs : dict
+        Keyed on node id, the ufunc that the node runs, or None for the
+        nodes that do not run a (single output) ufunc
+
+    edges : iterable
+        (source node, destination node) of each connection
+
+    Returns
+    -------
+    chains : list
+        Lists of node ids (of at least two nodes), in evaluation order
+    """
+    consumers = dict((node, set()) for node in ufuncs)
+    producers = dict((node, set()) for node in ufuncs)
+    for src, dst in edges:
+        consumers.setdefault(src, set()).add(dst)
+        producers.setdefault(dst, set()).add(src)
+
+    def fusable(node):
+        ufunc = ufuncs.get(node)
+        return ufunc is not None and ufunc.nout == 1
+
+    def feeds_only(node):
+        # the single consumer of `node`, if `node` is fusable
+        if not fusable(node) or len(consumers[node]) != 1:
+            return None
+        return next(iter(consumers[node]))
+
+    def next_node(node):
+        # the single consumer of `node`, if it continues the chain
+        nxt = feeds_only(node)
+        if nxt is None or not fusable(nxt):
+            return None
+        if sum(feeds_only(src) == nxt for src in producers[nxt]) > 1:
+            # several chains would end in `nxt`
+            return None
+        return nxt
+
+    chains = []
+    for node in sorted(ufuncs, key=str):
+        if not fusable(node):
+            continue
+        # only start from the head of a chain
+        if any(fusable(src) and next_node(src) == node
+               for src in producers[node]):
+            continue
+        chain = [node]
+        nxt = next_node(node)
+        while nxt is not None and nxt not in chain:
+            chain.append(nxt)
+            nxt = next_node(nxt)
+        if len(chain) > 1:
+            chains.append(chain)
+    return chains
+
+
+# only fuse block by block above this number of elements
+_FUSE_MIN_SIZE = 2 ** 16
+# bytes of each input per block
+_BLOCK_BYTES = 2 ** 18
+_NUMEXPR_TEMPLATES = {
+    'add': '({0} + {1})',
+    'subtract': '({0} - {1})',
+    'multiply': '({0} * {1})',
+    'true_divide': '({0} / {1})',
+    'divide': '({0} / {1})',
+    'power': '({0} ** {1})',
+    'negative': '(-{0})',
+    'absolute': 'abs({0})',
+    'sqrt': 'sqrt({0})',
+    'exp': 'exp({0})',
+    'expm1': 'expm1({0})',
+    'log': 'log({0})',
+    'log10': 'log10({0})',
+    'log1p': 'log1p({0})',
+    'sin': 'sin({0})',
+    'cos': 'cos({0})',
+    'tan': 'tan({0})',
+    'arcsin': 'arcsin({0})',
+    'arccos': 'arccos({0})',
+    'arctan': 'arctan({0})',
+    'arctan2': 'arctan2({0}, {1})',
+    'sinh': 'sinh({0})',
+    'cosh': 'cosh({0})',
+    'tanh': 'tanh({0})',
+    'greater': '({0} > {1})',
+    'greater_equal': '({0} >= {1})',
+    'less': '({0} < {1})',
+    'less_equal': '({0} <= {1})',
+    'equal': '({0} == {1})',
+    'not_equal': '({0} != {1})',
+}
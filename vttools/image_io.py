@@ -0,0 +1,217 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+"""
+Readers of file backed image series for the io modules in `vtmods.io`.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        )
+import six
+import logging
+import multiprocessing
+import os
+import time
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import tifffile
+from tifffile import imread
+
+logger = logging.getLogger(__name__)
+
+
+def load_numpy(fname, mmap_mode=None):
+    """Load the array(s) saved in a .npy or .npz file
+
+    Parameters
+    ----------
+    fname : str
+        Path of the file.  Without a '.npy' or '.npz' extension, '.npy'
+        is tried first and then '.npz'
+
+    mmap_mode : {None, 'r', 'r+', 'c'}, optional
+        Memory map .npy files instead of reading them, see `numpy.load`.
+        Opening the file is then nearly instant and only the parts of the
+        array that are used get read.  The members of .npz archives are
+        always read
+
+    Returns
+    -------
+    arrays : list
+        The array of a .npy file, the arrays of a .npz archive in archive
+        order
+    """
+    if not fname.endswith(('.npy', '.npz')):
+        if os.path.exists(fname + '.npy') or not os.path.exists(fname +
+                                                                 '.npz'):
+            fname += '.npy'
+        else:
+            fname += '.npz'
+    if fname.endswith('.npy'):
+        return [np.load(fname, mmap_mode=mmap_mode)]
+    archive = np.load(fname)
+    try:
+        return [archive[name] for name in archive.files]
+    finally:
+        archive.close()
+
+
+def memmap_tiff(fname):
+    """Memory map the image data of a TIFF file
+
+    Parameters
+    ----------
+    fname : str
+        Path of the TIFF file
+
+    Returns
+    -------
+    data : numpy.memmap or None
+        Read-only view of the image data, None if the file can not be
+        memory mapped (compressed or non-contiguous pages, or a tifffile
+        without memmap support)
+    """
+    tiff_memmap = getattr(tifffile, 'memmap', None)
+    if tiff_memmap is None:
+        return None
+    try:
+        return tiff_memmap(fname, mode='r')
+    except ValueError as ve:
+        logger.debug('can not memory map %s: %s', fname, ve)
+        return None
+
+
+def map_tiff_frames(files):
+    """Access a series of TIFF files without reading them into memory
+
+    Parameters
+    ----------
+    files : list
+        Paths of the TIFF files
+
+    Returns
+    -------
+    frames : list
+        A memory mapped array for each file that allows it, the decoded
+        data for the others
+    """
+    frames = []
+    for fname in files:
+        frame = memmap_tiff(fname)
+        if frame is None:
+            frame = imread(fname)
+        frames.append(frame)
+    return frames
+
+
+def read_tiff_stack(files, workers=1):
+    """Read a series of TIFF files into one 3-D array
+
+    The first file is read to learn the frame shape and dtype, the stack
+    is then allocated once and the other files are decoded concurrently
+    (tifffile releases the GIL while decoding and reading) straight into
+    their slot of the stack.
+
+    Parameters
+    ----------
+    files : list
+        Paths of the TIFF files, one frame (or page stack) per file, all
+        of the same shape and dtype
+
+    workers : int, optional
+        Number of reading threads, None uses one per CPU.  Defaults to 1
+
+    Returns
+    -------
+    stack : ndarray
+        The frames, in the order of `files`, stacked along the first axis
+
+    stats : dict
+        'files' : list of (file, bytes, seconds) of each file
+        'bytes', 'seconds' : total bytes read and wall time
+        'throughput' : aggregate bytes per second
+
+    Raises
+    ------
+    ValueError
+        If the frames do not all have the same shape and dtype
+    """
+    if not files:
+        raise ValueError('There are no files to read')
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    t0 = time.time()
+    first = imread(files[0])
+    file_stats = [(files[0], first.nbytes, time.time() - t0)]
+    stack = np.empty((len(files), ) + first.shape, dtype=first.dtype)
+    stack[0] = first
+
+    def read_into(idx):
+        t1 = time.time()
+        frame = stack[idx]
+        with tifffile.TiffFile(files[idx]) as tif:
+            # checked before decoding, tifffile would fill the slot with
+            # any frame of the same size
+            series = tif.series[0]
+            shape, dtype = tuple(series.shape), np.dtype(series.dtype)
+            if shape != first.shape or dtype != first.dtype:
+                raise ValueError('{0} is a {1} {2} frame, {3} is {4} {5}'
+                                 ''.format(files[idx], shape, dtype,
+                                           files[0], first.shape,
+                                           first.dtype))
+            tif.asarray(out=frame)
+        return files[idx], frame.nbytes, time.time() - t1
+
+    indices = range(1, len(files))
+    workers = max(1, min(workers, len(files) - 1))
+    if workers == 1:
+        file_stats.extend(read_into(idx) for idx in indices)
+    else:
+        pool = ThreadPool(workers)
+        try:
+            # map keeps the order of the files
+            file_stats.extend(pool.map(read_into, indices))
+        finally:
+            pool.close()
+            pool.join()
+
+    elapsed = time.time() - t0
+    total = sum(nbytes for _, nbytes, _ in file_stats)
+    stats = {'files': file_stats,
+             'bytes': total,
+             'seconds': elapsed,
+             'throughput': total / elapsed if elapsed else float('inf')}
+    logger.info('read %d files (%.1f MB) in %.2f s: %.1f MB/s',
+                len(files), total / 2 ** 20, elapsed,
+                stats['throughput'] / 2 ** 20)
+    return stack, stats
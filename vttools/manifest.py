@@ -0,0 +1,277 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+"""
+Build and read prebuilt spec manifests.
+
+A manifest holds the scraped specs of every function that the NSLS-II
+VisTrails package autowraps (the 'autowrap_module' and 'autowrap_func'
+entries of modules.yaml) so that the package can be loaded without
+parsing any docstrings.  Build one with ::
+
+    python -m vttools.manifest -o /path/to/spec_manifest.pkl.gz
+
+and point the package at it with the VTTOOLS_MANIFEST environment
+variable (or put it at `MANIFEST_PATH`).  The manifest records the
+versions of the wrapped libraries, rebuild it when they are upgraded.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        )
+import six
+from six.moves import cPickle as pickle
+import argparse
+import gzip
+import importlib
+import logging
+import os
+import sys
+from collections import OrderedDict
+
+from . import scrape
+from .vtmods.import_lists import load_config
+
+logger = logging.getLogger(__name__)
+
+# default location of the manifest
+MANIFEST_PATH = os.path.join(os.path.expanduser('~'), '.vttools',
+                             'spec_manifest.pkl.gz')
+# bump this when the layout of the manifest entries changes
+_MANIFEST_FORMAT = 2
+
+
+def autowrap_entries(import_dict=None, processes=None, cache_dir=None,
+                     defer_source=True):
+    """Scrape all of the autowrapped functions
+
+    The functions of the 'autowrap_module' entries of `import_dict` come
+    first, in module order and sorted by name, followed by the
+    'autowrap_func' entries.  An 'autowrap_func' entry replaces the
+    scraped function that would end up in the same VisTrails namespace
+    under the same name (for example numpy.convolve), so that no module
+    is wrapped twice.
+
+    Parameters
+    ----------
+    import_dict : dict, optional
+        Import configuration as returned by
+        `vttools.vtmods.import_lists.load_config`.  Defaults to the
+        contents of modules.yaml
+
+    processes : int or None, optional
+        Number of worker processes to scrape the modules with, see
+        `scrape.scrape_modules`
+
+    cache_dir : str or None, optional
+        Directory of the persistent spec cache, see `scrape.scrape_module`
+
+    defer_source : bool, optional
+        If True (the default) the specs only reference the function
+        sources (see `scrape.DeferredSource`) instead of holding them
+
+    Returns
+    -------
+    entries : list
+        Dictionaries suitable for passing to `wrap_lib.wrap_function`
+    """
+    if import_dict is None:
+        import_dict = load_config()
+
+    entries = OrderedDict()
+    all_specs = scrape.scrape_modules(
+        import_dict.get('autowrap_module', []), processes=processes,
+        black_list=import_dict.get('scrape_black_list'),
+        exclude_markers=import_dict.get('scrape_exclude_markers'),
+        cache_dir=cache_dir, defer_source=defer_source)
+    for mod_name, mod_specs in six.iteritems(all_specs):
+        for func_name, spec_dict in sorted(six.iteritems(mod_specs)):
+            entries[_entry_key(spec_dict)] = spec_dict
+
+    for func_dict in import_dict.get('autowrap_func', []):
+        func_dict = dict(func_dict)
+        try:
+            spec_dict = scrape.scrape_function(func_dict.pop('func_name'),
+                                               func_dict.pop('module_path'),
+                                               defer_source=defer_source)
+        except Exception as e:
+            logger.warn("%s failed scraping on %s", e, func_dict)
+            continue
+        # namespace and add_input_dict
+        spec_dict.update(func_dict)
+        key = _entry_key(spec_dict)
+        if key in entries:
+            logger.debug("autowrap_func entry %s replaces %s.%s", key,
+                         entries[key]['module_path'], spec_dict['func_name'])
+        entries[key] = spec_dict
+
+    return list(entries.values())
+
+
+def build_manifest(import_dict=None, processes=None, defer_source=True):
+    """Scrape all of the autowrapped functions for a manifest
+
+    See `autowrap_entries` for the parameters, the spec cache is not
+    used so that the manifest is built from the installed libraries.
+
+    Returns
+    -------
+    entries : list
+        Dictionaries suitable for passing to `wrap_lib.wrap_function`
+    """
+    return autowrap_entries(import_dict, processes=processes,
+                            defer_source=defer_source)
+
+
+def _entry_key(spec_dict):
+    """(namespace, name) of the VisTrails module wrapping a spec
+
+    The namespace is normalized like `wrap_lib.normalize_name_space` does
+    """
+    namespace = spec_dict.get('namespace') or spec_dict['module_path']
+    if '|' not in namespace:
+        namespace = namespace.replace('.', '|')
+    return namespace, spec_dict['func_name']
+
+
+def library_versions(entries):
+    """Versions of the top level packages the functions of `entries` are in
+
+    Parameters
+    ----------
+    entries : list
+        Output of `autowrap_entries`
+
+    Returns
+    -------
+    versions : dict
+        Version string (None if unknown or not importable) keyed on
+        package name
+    """
+    versions = {}
+    for package in set(entry['module_path'].split('.')[0]
+                       for entry in entries):
+        try:
+            mod = importlib.import_module(package)
+        except ImportError:
+            versions[package] = None
+            continue
+        versions[package] = getattr(mod, '__version__', None)
+    return versions
+
+
+def write_manifest(entries, manifest_path=MANIFEST_PATH):
+    """Write manifest entries to disk
+
+    Parameters
+    ----------
+    entries : list
+        Output of `build_manifest`
+
+    manifest_path : str, optional
+        File to write.  Defaults to `MANIFEST_PATH`
+    """
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    if not os.path.isdir(manifest_dir):
+        os.makedirs(manifest_dir)
+    with gzip.open(manifest_path, 'wb') as f:
+        pickle.dump({'format': _MANIFEST_FORMAT,
+                     'versions': library_versions(entries),
+                     'entries': entries}, f, protocol=2)
+
+
+def read_manifest(manifest_path=MANIFEST_PATH):
+    """Read the entries of a manifest
+
+    Parameters
+    ----------
+    manifest_path : str, optional
+        File to read.  Defaults to `MANIFEST_PATH`
+
+    Returns
+    -------
+    entries : list
+        Dictionaries suitable for passing to `wrap_lib.wrap_function`
+
+    Raises
+    ------
+    ValueError
+        If the manifest was written by an incompatible version of vttools
+
+    Notes
+    -----
+    A warning is logged for each library whose installed version differs
+    from the one the manifest was built against.
+    """
+    with gzip.open(manifest_path, 'rb') as f:
+        manifest = pickle.load(f)
+    if manifest.get('format') != _MANIFEST_FORMAT:
+        raise ValueError("Manifest {0} has format {1}, expected {2}. Please "
+                         "rebuild it.".format(manifest_path,
+                                              manifest.get('format'),
+                                              _MANIFEST_FORMAT))
+    installed = library_versions(manifest['entries'])
+    for package, version in sorted(six.iteritems(manifest['versions'])):
+        if installed.get(package) != version:
+            logger.warning("manifest %s was built against %s %s but %s is "
+                           "installed, please rebuild it", manifest_path,
+                           package, version, installed.get(package))
+    return manifest['entries']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Scrape the functions autowrapped by the NSLS-II '
+                    'VisTrails package into a spec manifest')
+    parser.add_argument('-o', '--output', default=MANIFEST_PATH,
+                        help='manifest file to write (default: %(default)s)')
+    parser.add_argument('-c', '--config', default=None,
+                        help='import configuration yaml file (default: '
+                             'the modules.yaml shipped with vttools)')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of scraping processes (default: one '
+                             'per CPU)')
+    parser.add_argument('--full-source', action='store_true',
+                        help='store the function sources in the manifest '
+                             'instead of reading them on demand')
+    args = parser.parse_args(argv)
+
+    entries = build_manifest(load_config(args.config),
+                             processes=args.processes,
+                             defer_source=not args.full_source)
+    write_manifest(entries, args.output)
+    print('wrote {0} entries to {1}'.format(len(entries), args.output))
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    sys.exit(main())
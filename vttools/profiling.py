@@ -0,0 +1,406 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+"""
+Timing instrumentation for the scrape/wrap pipeline.
+
+`scrape` and `wrap_lib` record how long each step of turning a library
+into VisTrails modules takes, per module and per function:
+
+    ==========  ==========================================
+    stage       what is timed
+    ==========  ==========================================
+    import      importing the module (scrape_module)
+    cache       reading the spec cache (scrape_module)
+    parse       numpydoc parsing of the docstring
+    source      reading the function source
+    ports       defining the input and output ports
+    wrap        generating the VisTrails module class
+    ==========  ==========================================
+
+`startup_report` returns the numbers as a dictionary and
+`log_startup_summary` logs the slowest modules and functions.
+
+The execution of the generated modules can be profiled as well.  When
+`enable_execution_profiling` has been called before the modules are
+generated, their `compute` records, per module class, the number of calls,
+the wall time, the size of the inputs and outputs and (optionally) the
+peak memory allocated, as reported by `tracemalloc`.  Modules generated
+while the profiling is disabled are not instrumented at all.
+`execution_report`, `format_execution_report` and
+`dump_execution_report` give the numbers.
+
+`coercion_report` counts, per module input port, how the values were
+converted to arrays on their way into the wrapped functions.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        )
+import six
+import copy
+import functools
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+try:
+    import tracemalloc
+except ImportError:
+    # python 2
+    tracemalloc = None
+
+logger = logging.getLogger(__name__)
+
+
+def record_startup(module_path, stage, seconds, func_name=None):
+    """Add `seconds` to the time spent in `stage`
+
+    Parameters
+    ----------
+    module_path : str
+        Module being scraped/wrapped
+
+    stage : str
+        Name of the step, see the module docstring
+
+    seconds : float
+        Time spent
+
+    func_name : str, optional
+        Function being scraped/wrapped.  If None the time is recorded
+        against the module itself.
+    """
+    entry = _STARTUP_TIMES.setdefault(module_path, {'functions': {}})
+    if func_name is not None:
+        entry = entry['functions'].setdefault(func_name, {})
+    entry[stage] = entry.get(stage, 0) + seconds
+
+
+@contextmanager
+def startup_timer(module_path, stage, func_name=None):
+    """Context manager that records the time spent in its body
+
+    See `record_startup` for the parameters.
+    """
+    t0 = time.time()
+    try:
+        yield
+    finally:
+        record_startup(module_path, stage, time.time() - t0, func_name)
+
+
+def startup_report():
+    """The recorded times
+
+    Returns
+    -------
+    report : dict
+        Keyed on module path.  Each value maps module level stages to
+        seconds, and 'functions' to a dict of function name to a dict of
+        stage to seconds.
+    """
+    return copy.deepcopy(_STARTUP_TIMES)
+
+
+def merge_startup_report(report):
+    """Add the times of `report` (for example from a worker process)
+    """
+    for module_path, entry in six.iteritems(report):
+        for stage, seconds in six.iteritems(entry):
+            if stage == 'functions':
+                continue
+            record_startup(module_path, stage, seconds)
+        for func_name, stages in six.iteritems(entry['functions']):
+            for stage, seconds in six.iteritems(stages):
+                record_startup(module_path, stage, seconds, func_name)
+
+
+def reset_startup_report():
+    """Forget all recorded times
+    """
+    _STARTUP_TIMES.clear()
+
+
+def dump_startup_report(fname):
+    """Write `startup_report` to `fname` as JSON
+    """
+    with open(fname, 'w') as f:
+        json.dump(startup_report(), f, indent=1, sort_keys=True)
+
+
+def startup_summary(n=10):
+    """The `n` slowest modules and functions
+
+    Parameters
+    ----------
+    n : int, optional
+        Number of entries of each kind
+
+    Returns
+    -------
+    modules : list
+        (total seconds, module path) of the slowest modules, slowest first
+    functions : list
+        (total seconds, 'module.function', stages) of the slowest
+        functions, slowest first
+    """
+    modules = []
+    functions = []
+    for module_path, entry in six.iteritems(_STARTUP_TIMES):
+        total = sum(v for k, v in six.iteritems(entry) if k != 'functions')
+        for func_name, stages in six.iteritems(entry['functions']):
+            func_total = sum(six.itervalues(stages))
+            total += func_total
+            functions.append((func_total,
+                              '{0}.{1}'.format(module_path, func_name),
+                              stages))
+        modules.append((total, module_path))
+    modules.sort(reverse=True)
+    functions.sort(key=lambda x: x[0], reverse=True)
+    return modules[:n], functions[:n]
+
+
+def log_startup_summary(n=10):
+    """Log the `n` slowest modules and functions (at info level)
+    """
+    modules, functions = startup_summary(n)
+    lines = ['slowest modules:']
+    lines.extend('  {0:8.3f}s  {1}'.format(t, name) for t, name in modules)
+    lines.append('slowest functions:')
+    lines.extend('  {0:8.3f}s  {1}  ({2})'.format(
+        t, name, ', '.join('{0}: {1:.3f}s'.format(k, v)
+                           for k, v in sorted(six.iteritems(stages))))
+        for t, name, stages in functions)
+    logger.info('\n'.join(lines))
+
+
+def enable_execution_profiling(trace_memory=True):
+    """Instrument the compute of the modules generated from now on
+
+    Parameters
+    ----------
+    trace_memory : bool, optional
+        Also record the peak memory allocated during each call with
+        `tracemalloc` (which slows down allocations).  Ignored on python 2
+    """
+    _EXECUTION_PROFILING['enabled'] = True
+    _EXECUTION_PROFILING['trace_memory'] = (trace_memory and
+                                            tracemalloc is not None)
+
+
+def disable_execution_profiling():
+    """Generate modules without instrumentation from now on
+
+    Modules that are already instrumented keep recording.
+    """
+    _EXECUTION_PROFILING['enabled'] = False
+
+
+def execution_profiling_enabled():
+    """Whether newly generated modules are instrumented
+    """
+    return _EXECUTION_PROFILING['enabled']
+
+
+def profile_compute(name, compute):
+    """Instrument the compute method of a generated module
+
+    Parameters
+    ----------
+    name : str
+        Key of the module class in the execution report
+
+    compute : callable
+        The compute method
+
+    Returns
+    -------
+    compute : callable
+        `compute` itself when the profiling is disabled, a recording
+        wrapper otherwise
+    """
+    if not _EXECUTION_PROFILING['enabled']:
+        return compute
+    trace_memory = _EXECUTION_PROFILING['trace_memory']
+
+    @functools.wraps(compute)
+    def profiled(self):
+        in_bytes = sum(_payload_bytes(self.get_input(port.name))
+                       for port in self._input_ports
+                       if self.has_input(port.name))
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if hasattr(tracemalloc, 'reset_peak'):
+                # python >= 3.9, the peak is otherwise since the start
+                tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        t0 = time.time()
+        try:
+            compute(self)
+        finally:
+            elapsed = time.time() - t0
+            peak = 0
+            if trace_memory:
+                peak = max(0, tracemalloc.get_traced_memory()[1] - base)
+            out_bytes = sum(_payload_bytes(val)
+                            for val in six.itervalues(self.outputs))
+            _record_execution(name, elapsed, in_bytes, out_bytes, peak)
+
+    return profiled
+
+
+def _record_execution(name, seconds, in_bytes, out_bytes, peak_bytes):
+    """Add one call of module `name` to the execution report
+    """
+    entry = _EXECUTION_STATS.setdefault(name, {'calls': 0,
+                                               'total_time': 0.,
+                                               'max_time': 0.,
+                                               'in_bytes': 0,
+                                               'out_bytes': 0,
+                                               'peak_bytes': 0})
+    entry['calls'] += 1
+    entry['total_time'] += seconds
+    entry['max_time'] = max(entry['max_time'], seconds)
+    entry['in_bytes'] += in_bytes
+    entry['out_bytes'] += out_bytes
+    entry['peak_bytes'] = max(entry['peak_bytes'], peak_bytes)
+
+
+def _payload_bytes(val):
+    """Approximate size of a port value (arrays report their buffer)
+    """
+    nbytes = getattr(val, 'nbytes', None)
+    if isinstance(nbytes, six.integer_types):
+        return nbytes
+    if isinstance(val, (list, tuple)):
+        return sum(_payload_bytes(item) for item in val)
+    return sys.getsizeof(val)
+
+
+def execution_report():
+    """The recorded executions
+
+    Returns
+    -------
+    report : dict
+        Keyed on module name.  Each value has the number of 'calls', the
+        'total_time' and 'max_time' in seconds, the summed 'in_bytes' and
+        'out_bytes' of the inputs and outputs and the largest
+        'peak_bytes' allocated during a call (0 when not traced).
+    """
+    return copy.deepcopy(_EXECUTION_STATS)
+
+
+def reset_execution_report():
+    """Forget all recorded executions
+    """
+    _EXECUTION_STATS.clear()
+
+
+def dump_execution_report(fname):
+    """Write `execution_report` to `fname` as JSON
+    """
+    with open(fname, 'w') as f:
+        json.dump(execution_report(), f, indent=1, sort_keys=True)
+
+
+def format_execution_report(n=None):
+    """The recorded executions as a text table, slowest module first
+
+    Parameters
+    ----------
+    n : int, optional
+        Only show the `n` slowest modules
+
+    Returns
+    -------
+    table : str
+    """
+    rows = sorted(six.iteritems(_EXECUTION_STATS),
+                  key=lambda item: item[1]['total_time'], reverse=True)
+    lines = ['{0:>7} {1:>10} {2:>10} {3:>10} {4:>10} {5:>10}  {6}'.format(
+        'calls', 'total s', 'max s', 'in MB', 'out MB', 'peak MB', 'module')]
+    for name, entry in rows[:n]:
+        lines.append('{0:7d} {1:10.4f} {2:10.4f} {3:10.1f} {4:10.1f} '
+                     '{5:10.1f}  {6}'.format(entry['calls'],
+                                             entry['total_time'],
+                                             entry['max_time'],
+                                             entry['in_bytes'] / 2 ** 20,
+                                             entry['out_bytes'] / 2 ** 20,
+                                             entry['peak_bytes'] / 2 ** 20,
+                                             name))
+    return '\n'.join(lines)
+
+
+def record_coercion(name, outcome):
+    """Count one value going through the coercion of an input port
+
+    Parameters
+    ----------
+    name : str
+        '<module>.<port>'
+
+    outcome : {'passthrough', 'converted', 'skipped', 'failed'}
+        The value was already fine, was converted, is not of a kind that
+        is converted, or could not be converted (and was passed as-is)
+    """
+    counts = _COERCION_COUNTS.setdefault(name, {'passthrough': 0,
+                                                'converted': 0,
+                                                'skipped': 0,
+                                                'failed': 0})
+    counts[outcome] += 1
+
+
+def coercion_report():
+    """The coercion counts of the input ports, see `record_coercion`
+
+    Returns
+    -------
+    report : dict
+        Keyed on '<module>.<port>', values map the outcomes to counts
+    """
+    return copy.deepcopy(_COERCION_COUNTS)
+
+
+def reset_coercion_report():
+    """Forget all coercion counts
+    """
+    _COERCION_COUNTS.clear()
+
+
+_STARTUP_TIMES = {}
+_EXECUTION_STATS = {}
+_EXECUTION_PROFILING = {'enabled': False, 'trace_memory': False}
+_COERCION_COUNTS = {}
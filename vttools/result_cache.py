@@ -0,0 +1,281 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+"""
+Content addressed cache of the results of wrapped library functions.
+
+Modules generated with ``cache_results=True`` (see
+`wrap_lib.wrap_function`) look their results up here before calling the
+library function.  The key is a hash of the function identity and of the
+argument values, numpy arrays being hashed from their buffers, so a
+pipeline re-executed after a change downstream does not re-run the
+upstream functions whose inputs did not change.
+
+The cache is shared by all the generated modules and evicts the least
+recently used results once the results it holds add up to more than
+`set_result_cache_budget` bytes.  Cached results are shared between
+executions, so they must not be modified in place.  Calls with arguments
+that can not be hashed by value (arbitrary objects, ndarray subclasses)
+and calls of functions without a stable identity (partials, callable
+instances, closures) are never cached.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        )
+import six
+import hashlib
+import logging
+import sys
+import threading
+import types
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _Uncacheable(Exception):
+    """Raised while hashing an argument that can not be hashed by value"""
+    pass
+
+
+def result_key(func, args=(), kwargs=None):
+    """Cache key of calling `func` with `args` and `kwargs`
+
+    Parameters
+    ----------
+    func : callable
+        The library function
+
+    args : tuple, optional
+        Positional arguments
+
+    kwargs : dict, optional
+        Keyword arguments
+
+    Returns
+    -------
+    key : str or None
+        Hex digest identifying the call, None if `func` has no stable
+        identity (see `_func_identity`) or if one of the arguments can
+        not be hashed by value
+    """
+    identity = _func_identity(func)
+    if identity is None:
+        return None
+    h = hashlib.sha1()
+    h.update(identity.encode('utf-8'))
+    try:
+        _hash_value(h, tuple(args))
+        _hash_value(h, kwargs or {})
+    except _Uncacheable:
+        return None
+    return h.hexdigest()
+
+
+def _func_identity(func):
+    """Name identifying `func` across calls, None if there is none
+
+    Module level functions, classes and ufuncs are identified by their
+    module and name.  Callables whose behaviour depends on state the
+    name does not capture (partials, callable instances, bound methods,
+    closures, lambdas) have no stable identity.
+    """
+    name = getattr(func, '__qualname__', getattr(func, '__name__', None))
+    module = getattr(func, '__module__', None)
+    if module is None and isinstance(func, np.ufunc):
+        # the ufuncs of older numpy versions have no __module__
+        if getattr(np, func.__name__, None) is func:
+            module = 'numpy'
+    if name is None or module is None or '<' in name:
+        # '<lambda>', '<locals>'
+        return None
+    if getattr(func, '__closure__', None):
+        return None
+    bound_to = getattr(func, '__self__', None)
+    if bound_to is not None and not isinstance(bound_to, types.ModuleType):
+        return None
+    return '{0}:{1}.{2}'.format(type(func).__name__, module, name)
+
+
+def _hash_value(h, val):
+    """Feed `val` into the hash object `h`
+    """
+    if isinstance(val, np.ndarray):
+        if val.dtype.hasobject or type(val) not in _ARRAY_TYPES:
+            # subclasses carry state (masks...) besides the buffer
+            raise _Uncacheable()
+        h.update('ndarray{0}{1}'.format(val.dtype.str,
+                                        val.shape).encode('utf-8'))
+        h.update(np.ascontiguousarray(val).view(np.uint8).ravel().data)
+    elif isinstance(val, (list, tuple)):
+        h.update('{0}{1}'.format(type(val).__name__,
+                                 len(val)).encode('utf-8'))
+        for item in val:
+            _hash_value(h, item)
+    elif isinstance(val, dict):
+        h.update('dict{0}'.format(len(val)).encode('utf-8'))
+        for key in sorted(val, key=repr):
+            _hash_value(h, key)
+            _hash_value(h, val[key])
+    elif val is None or isinstance(val, _SCALAR_TYPES):
+        h.update('{0}{1!r}'.format(type(val).__name__,
+                                   val).encode('utf-8'))
+    else:
+        raise _Uncacheable()
+
+
+def _nbytes(val):
+    """Approximate memory held by a result
+    """
+    if isinstance(val, np.ndarray):
+        return val.nbytes
+    if isinstance(val, (list, tuple)):
+        return sum(_nbytes(item) for item in val)
+    return sys.getsizeof(val)
+
+
+def cached_call(func, args=(), kwargs=None, key_func=None):
+    """Call ``func(*args, **kwargs)``, going through the result cache
+
+    Parameters
+    ----------
+    func : callable
+        The library function
+
+    args : tuple, optional
+        Positional arguments
+
+    kwargs : dict, optional
+        Keyword arguments
+
+    key_func : callable, optional
+        Function the call is keyed on instead of `func`, when `func` is a
+        wrapper returning the same results as `key_func`
+
+    Returns
+    -------
+    result : object
+        What `func` returns (possibly from an earlier call)
+    """
+    if kwargs is None:
+        kwargs = {}
+    if key_func is None:
+        key_func = func
+    key = result_key(key_func, args, kwargs)
+    if key is None:
+        with _LOCK:
+            _STATS['uncacheable'] += 1
+        return func(*args, **kwargs)
+
+    with _LOCK:
+        entry = _RESULTS.pop(key, None)
+        if entry is not None:
+            _STATS['hits'] += 1
+            # re-insert as the most recently used
+            _RESULTS[key] = entry
+            return entry[0]
+        _STATS['misses'] += 1
+
+    result = func(*args, **kwargs)
+    nbytes = _nbytes(result)
+    if nbytes > _STATS['max_bytes']:
+        logger.debug('result of %s (%d bytes) is too large to be cached',
+                     getattr(func, '__name__', func), nbytes)
+        return result
+    with _LOCK:
+        old = _RESULTS.pop(key, None)
+        if old is not None:
+            _STATS['nbytes'] -= old[1]
+        _RESULTS[key] = (result, nbytes)
+        _STATS['nbytes'] += nbytes
+        _evict()
+    return result
+
+
+def _evict():
+    """Drop the least recently used results until within the budget
+
+    Must be called with `_LOCK` held.
+    """
+    while _STATS['nbytes'] > _STATS['max_bytes'] and _RESULTS:
+        _, (_, nbytes) = _RESULTS.popitem(last=False)
+        _STATS['nbytes'] -= nbytes
+        _STATS['evictions'] += 1
+
+
+def set_result_cache_budget(max_bytes):
+    """Set the total size of the results the cache may hold
+
+    Parameters
+    ----------
+    max_bytes : int
+        Budget in bytes, 0 disables caching
+    """
+    with _LOCK:
+        _STATS['max_bytes'] = int(max_bytes)
+        _evict()
+
+
+def result_cache_info():
+    """Statistics of the result cache
+
+    Returns
+    -------
+    info : dict
+        'hits', 'misses', 'uncacheable' (calls that were not cached),
+        'evictions', the number of cached results ('size'), their total
+        'nbytes' and the 'max_bytes' budget
+    """
+    with _LOCK:
+        return dict(_STATS, size=len(_RESULTS))
+
+
+def clear_result_cache():
+    """Empty the result cache and reset its statistics
+    """
+    with _LOCK:
+        _RESULTS.clear()
+        _STATS.update(hits=0, misses=0, uncacheable=0, evictions=0,
+                      nbytes=0)
+
+
+_SCALAR_TYPES = (bool, float, complex, np.generic, six.binary_type,
+                 six.text_type) + six.integer_types
+# the memmap subclass only adds the file backing the buffer
+_ARRAY_TYPES = (np.ndarray, np.memmap)
+_DEFAULT_BUDGET = 512 * 2 ** 20
+_RESULTS = OrderedDict()
+_STATS = {'hits': 0, 'misses': 0, 'uncacheable': 0, 'evictions': 0,
+          'nbytes': 0, 'max_bytes': _DEFAULT_BUDGET}
+_LOCK = threading.Lock()
@@ -36,21 +36,38 @@
 from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
 import six
+from six.moves import cPickle as pickle
+import functools
+import hashlib
 import inspect
 import importlib
 import logging
+import multiprocessing
+import os
 import re
+import sys
+import tempfile
 from collections import OrderedDict
-from numpydoc.docscrape import FunctionDoc, ClassDoc
 import numpy
 
 from skxray.core.utils import verbosedict
 import abc
 
+from . import profiling
+from .profiling import startup_timer
+from .utils import dump_pickle
+
 logger = logging.getLogger(__name__)
 
 vt_reserved = ('domain', 'window')
 
+# default location of the on-disk cache of scraped module specs
+SPEC_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.vttools',
+                              'spec_cache')
+# bump this when the layout of the spec dictionaries changes so that
+# stale caches written by older versions of vttools are ignored
+_SPEC_CACHE_FORMAT = 3
+
 
 class AutowrapError(Exception):
     '''Exception to flag an autowrapping error
@@ -123,6 +140,9 @@ def docstring_class(pyobj):
         Taken from:
             https://github.com/numpy/numpydoc/blob/master/numpydoc/docscrape.py#L94
     """
+    # numpydoc is imported on demand so that building modules from a
+    # prebuilt spec manifest does not pay for it
+    from numpydoc.docscrape import ClassDoc
     if inspect.isclass(pyobj):
         return ClassDoc(pyobj)
     else:
@@ -166,6 +186,7 @@ def docstring_func(pyobj):
         Taken from:
             https://github.com/numpy/numpydoc/blob/master/numpydoc/docscrape.py#L94
     """
+    from numpydoc.docscrape import FunctionDoc
     return FunctionDoc(pyobj)
 
 
@@ -198,6 +219,66 @@ def _extract_default_vals(pyobj):
     return dict()
 
 
+def _memoize(func):
+    """
+    Bounded (least recently used) memo cache for the single argument type
+    parsing helpers.
+
+    The same few hundred type strings show up tens of thousands of times
+    when scraping numpy/scipy, so the helpers remember their results.
+    Exceptions are not cached.  See `type_cache_info` and
+    `clear_type_caches`.
+    """
+    cache = OrderedDict()
+    stats = {'hits': 0, 'misses': 0}
+
+    @functools.wraps(func)
+    def wrapper(arg):
+        result = cache.pop(arg, _CACHE_MISS)
+        if result is _CACHE_MISS:
+            stats['misses'] += 1
+            result = func(arg)
+            if len(cache) >= _TYPE_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            stats['hits'] += 1
+        # (re-)insert as the most recently used
+        cache[arg] = result
+        return result
+
+    _TYPE_CACHES[func.__name__] = (cache, stats)
+    return wrapper
+
+
+def type_cache_info():
+    """Hit/miss statistics of the memoized type parsing helpers
+
+    Returns
+    -------
+    info : dict
+        Keyed on helper name, values are dicts with the 'hits', 'misses'
+        and current 'size' of the cache, as well as its 'maxsize'
+    """
+    return dict((name, dict(stats, size=len(cache),
+                            maxsize=_TYPE_CACHE_SIZE))
+                for name, (cache, stats) in six.iteritems(_TYPE_CACHES))
+
+
+def clear_type_caches():
+    """Empty the memoized type parsing caches and reset their statistics
+    """
+    for cache, stats in six.itervalues(_TYPE_CACHES):
+        cache.clear()
+        stats['hits'] = stats['misses'] = 0
+
+
+# maximum number of type strings remembered by each memoized helper
+_TYPE_CACHE_SIZE = 4096
+_TYPE_CACHES = {}
+_CACHE_MISS = object()
+
+
+@_memoize
 def _type_optional(type_str):
     """
     Helper function to sort out if a parameter is optional
@@ -275,6 +356,13 @@ sig_map = verbosedict({
     'callable': 'basic:Variant'
 })
 
+# scraped types whose incoming values wrap_lib converts, see
+# `wrap_lib._coerce_array`
+coerce_map = {
+    'array': 'array',
+    'matrix': 'array',
+}
+
 
 precedence_list = ('list',
                    'tuple',
@@ -302,6 +390,32 @@ precedence_list = ('list',
 #   port key (e.g. 2D, 3D, 1xN, NxN, NxM, LxMxN, etc.)
 
 
+_CONTAINER_TYPES = ('list', 'tuple', 'array', 'matrix', 'seq')
+
+# finds the first 'or' or 'of' in a type string in one scan
+_CONJUNCTION_RE = re.compile(r'\b(or|of)\b')
+
+
+def _classifier_alternative(n_type):
+    """
+    Turn the `_RE_DICT` pattern for `n_type` into a named alternative of
+    `_TYPE_CLASSIFIER_RE`.  Patterns that are not anchored at the start
+    are searched for anywhere in the string by the original walk, so
+    they are prefixed with a lazy match-anything.
+    """
+    pattern = _RE_DICT[n_type].pattern.replace('(?i)', '')
+    if not pattern.startswith('^'):
+        pattern = r'[\s\S]*?' + pattern
+    return '(?P<{0}>{1})'.format(n_type, pattern)
+
+# All of the type patterns as one alternation in precedence order.  The
+# alternatives are tried in turn at the start of the string, so the
+# first one to match is the type that the precedence walk would return.
+_TYPE_CLASSIFIER_RE = re.compile('|'.join(_classifier_alternative(n_type)
+                                          for n_type in precedence_list),
+                                 re.IGNORECASE)
+
+
 def _enum_type(type_str):
     """
     Helper function to check if the docstring enumerates options
@@ -320,10 +434,21 @@ def _enum_type(type_str):
     is_enum : bool
         Boolean switch specifying whether inputs include enumerated options.
     """
+    type_out, is_enum, enum_vals = _parse_enum(type_str)
+    # hand out a fresh list, the parsed values are shared through the memo
+    enum_list = list(enum_vals) if enum_vals is not None else None
+    return type_out, is_enum, enum_list
+
+
+@_memoize
+def _parse_enum(type_str):
+    """
+    Memoized worker of `_enum_type`, returns the enum values as a tuple
+    """
     m = _ENUM_RE.search(type_str)
     if bool(m):
         is_enum = True
-        enum_list = [_.strip('\'\" ') for _ in m.group(1).split(',')]
+        enum_list = tuple(_.strip('\'\" ') for _ in m.group(1).split(','))
         guessed_types = [_guess_enum_val_type(_) for _ in enum_list]
         type_out = guessed_types[0]
         if not all(_ == type_out for _ in guessed_types[1:]):
@@ -373,6 +498,7 @@ def _truncate_description(original_description, word_cnt_to_include):
     return short_description
 
 
+@_memoize
 def _guess_enum_val_type(stringy_val):
     """
     Helper function to guess the type of values in an enum are.
@@ -405,6 +531,7 @@ def _guess_enum_val_type(stringy_val):
     return 'str'
 
 
+@_memoize
 def _normalize_type(the_type):
     """
     A single entry point for parsing the type.
@@ -412,6 +539,54 @@ def _normalize_type(the_type):
     This assumes that enums and optional properties have been
     taken care of.
 
+    The string is scanned once for the 'or'/'of' conjunctions and then
+    classified with a single match of `_TYPE_CLASSIFIER_RE`, which gives
+    the same answer as searching the `_RE_DICT` patterns one after the
+    other in `precedence_list` order (see `_normalize_type_walk`).
+
+    Parameters
+    ----------
+    the_type : str
+        The type string extracted from the docs
+
+    Returns
+    -------
+    norm_type : str
+        The normalized type
+    """
+    # get rid of all leading and trailing junk
+    the_type = the_type.strip(' .!?-_\t`').rstrip(' .!?-_\t`')
+
+    conj = _CONJUNCTION_RE.search(the_type)
+    if conj is not None:
+        # 'or' takes precedence over an 'of' anywhere in the string
+        if conj.group(1) == 'or' or _OR_REGEX.search(the_type, conj.end()):
+            left, right = the_type.split('or', 1)
+            return _type_precedence(left, right)
+        left, right = the_type.split('of', 1)
+        return _of_proc(left, right)
+
+    match = _TYPE_CLASSIFIER_RE.match(the_type)
+    if match is not None:
+        return match.lastgroup
+
+    if _COMMA_REGEX.search(the_type):
+        left, right = the_type.split(',', 1)
+        return _type_precedence(left, right)
+
+    # of no patterns matched, return None to signal
+    # failure and let down-stream sort it out.
+    return None
+
+
+def _normalize_type_walk(the_type):
+    """
+    Normalize the type by walking the `_RE_DICT` patterns in
+    `precedence_list` order.
+
+    This is the reference implementation that `_normalize_type` replaced,
+    it is kept to check the two against each other.
+
     Parameters
     ----------
     the_type : str
@@ -427,11 +602,13 @@ def _normalize_type(the_type):
     # if 'or'
     if _OR_REGEX.search(the_type):
         left, right = the_type.split('or', 1)
-        return _type_precedence(left, right)
+        return _pick_precedence(_normalize_type_walk(left),
+                                _normalize_type_walk(right))
 
     if _OF_REGEX.search(the_type):
         left, right = the_type.split('of', 1)
-        return _of_proc(left, right)
+        left = _normalize_type_walk(left)
+        return left if left in _CONTAINER_TYPES else None
 
     # Walk the precedence list to see what we get
     for n_type in precedence_list:
@@ -440,10 +617,9 @@ def _normalize_type(the_type):
 
     if _COMMA_REGEX.search(the_type):
         left, right = the_type.split(',', 1)
-        return _type_precedence(left, right)
+        return _pick_precedence(_normalize_type_walk(left),
+                                _normalize_type_walk(right))
 
-    # of no patterns matched, return None to signal
-    # failure and let down-stream sort it out.
     return None
 
 
@@ -455,7 +631,7 @@ def _of_proc(left, right):
     the left side.
     """
     left = _normalize_type(left)
-    if left in ('list', 'tuple', 'array', 'matrix', 'seq'):
+    if left in _CONTAINER_TYPES:
         return left
     return None
 
@@ -467,8 +643,14 @@ def _type_precedence(left, right):
 
 
     """
-    left = _normalize_type(left)
-    right = _normalize_type(right)
+    return _pick_precedence(_normalize_type(left), _normalize_type(right))
+
+
+def _pick_precedence(left, right):
+    """
+    Pick the higher precedence of two normalized types, either of
+    which may be None.
+    """
     if left is None:
         return right
     elif right is None:
@@ -568,6 +750,10 @@ def define_input_ports(docstring, func, short_description_word_count=4):
                      'docstring': '\n'.join(the_description),
                      'optional': is_optional,
                      'signature': sig_map[port_type]}
+            if port_type in coerce_map:
+                # how wrap_lib converts the incoming values, this is not
+                # a VisTrails port argument
+                pdict['coerce'] = coerce_map[port_type]
 
             if port_name in kwarg_defaults:
                 tmp_v = kwarg_defaults[port_name]
@@ -687,7 +873,67 @@ def define_output_ports(docstring, short_description_word_count=4):
     return output_ports
 
 
-def scrape_function(func_name, module_path):
+class DeferredSource(object):
+    """Stand-in for the VisTrails docstring of a function
+
+    `scrape_function` uses the full source of a function as its
+    VisTrails docstring.  Reading the source means reading and tokenizing
+    the file it lives in, so with `defer_source` the spec holds one of
+    these instead and the source is only fetched (by `resolve`) when
+    someone asks for the documentation.  Instances only hold the names,
+    so they pickle into the spec cache and manifests.
+
+    Parameters
+    ----------
+    func_name : str
+        Name of the function
+
+    module_path : str
+        Name of the module which contains the function
+    """
+    def __init__(self, func_name, module_path):
+        self.func_name = func_name
+        self.module_path = module_path
+
+    def resolve(self):
+        """Fetch the source (or failing that the docstring)
+
+        Returns
+        -------
+        doc_string : str
+        """
+        mod = importlib.import_module(self.module_path)
+        return _function_source(getattr(mod, self.func_name))
+
+    def __eq__(self, other):
+        return (isinstance(other, DeferredSource) and
+                (self.func_name, self.module_path) ==
+                (other.func_name, other.module_path))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.func_name, self.module_path))
+
+    def __repr__(self):
+        return 'DeferredSource({0!r}, {1!r})'.format(self.func_name,
+                                                     self.module_path)
+
+
+def _function_source(func):
+    """The VisTrails docstring of `func`
+    """
+    try:
+        # if we can get the source, use the whole thing as the
+        # docstring in vistrails
+        return obj_src(func)
+    except (IOError, TypeError):
+        # if we can't, just use the docstring
+        return func.__doc__
+
+
+def scrape_function(func_name, module_path, defer_source=False):
     """Scrap function doc-string of a function for intput/output types
 
     Parameters
@@ -698,6 +944,10 @@ def scrape_function(func_name, module_path):
     module_path : str
         Name of the module which contains the function. Example: 'skxray.core'
 
+    defer_source : bool, optional
+        If True, 'doc_string' is a `DeferredSource` which only reads the
+        source of the function when it is resolved
+
     Returns
     -------
     spec : dict
@@ -708,7 +958,7 @@ def scrape_function(func_name, module_path):
        ------------ -----------------
        input_ports  list of dicts
        output_ports list of dicts
-       doc_string   doc string
+       doc_string   doc string (or DeferredSource)
        f_type       {func, ufunc}
        func_name    name of function
        module_path  location of function
@@ -719,21 +969,21 @@ def scrape_function(func_name, module_path):
     func = getattr(mod, func_name)
 
     # get the docstring of the function
-    doc = docstring_func(func)
+    with startup_timer(module_path, 'parse', func_name):
+        doc = docstring_func(func)
 
     # get the source of the function
-    try:
-        # if we can get the source, use the whole thing as the
-        # docstring in vistrails
-        doc_string = obj_src(func)
-    except (IOError, TypeError):
-        # if we can't, just use the docstring
-        doc_string = func.__doc__
-    # create the VisTrails input ports
-    input_ports = define_input_ports(doc, func)
-    # pprint.pprint(input_ports)
-    # create the VisTrails output ports
-    output_ports = define_output_ports(doc)
+    if defer_source:
+        doc_string = DeferredSource(func_name, module_path)
+    else:
+        with startup_timer(module_path, 'source', func_name):
+            doc_string = _function_source(func)
+    with startup_timer(module_path, 'ports', func_name):
+        # create the VisTrails input ports
+        input_ports = define_input_ports(doc, func)
+        # pprint.pprint(input_ports)
+        # create the VisTrails output ports
+        output_ports = define_output_ports(doc)
     if isinstance(func, numpy.ufunc):
         f_type = 'ufunc'
     else:
@@ -746,9 +996,73 @@ def scrape_function(func_name, module_path):
             'module_path': module_path}
 
 
+def scrape_class(class_name, module_path, methods=None):
+    """Scrape the docstrings of a class and of its methods
+
+    The constructor ports come from the 'Parameters' of the class
+    docstring (with the defaults of ``__init__``).  Methods that can not
+    be scraped are logged and left out.
+
+    Parameters
+    ----------
+    class_name : str
+        Name of the class to wrap into VisTrails. Example 'GaussianModel'
+
+    module_path : str
+        Name of the module which contains the class
+
+    methods : list, optional
+        Names of the methods to scrape.  Defaults to the public methods
+        listed by numpydoc
+
+    Returns
+    -------
+    spec : dict
+        'class_name' and 'module_path', 'constructor' a dict with the
+        'input_ports', 'output_ports' (empty) and 'doc_string' of the
+        class and 'methods' a dict of method name to the same kind of
+        dict for each method
+    """
+    mod = importlib.import_module(module_path)
+    cls = getattr(mod, class_name)
+
+    with startup_timer(module_path, 'parse', class_name):
+        doc = docstring_class(cls)
+    with startup_timer(module_path, 'ports', class_name):
+        constructor = {'input_ports': define_input_ports(doc, cls.__init__),
+                       'output_ports': [],
+                       'doc_string': _function_source(cls)}
+
+    if methods is None:
+        methods = doc.methods
+    method_specs = {}
+    for method_name in methods:
+        method = getattr(cls, method_name)
+        func_name = '{0}.{1}'.format(class_name, method_name)
+        try:
+            with startup_timer(module_path, 'parse', func_name):
+                method_doc = docstring_func(method)
+            with startup_timer(module_path, 'ports', func_name):
+                method_specs[method_name] = {
+                    'input_ports': define_input_ports(method_doc, method),
+                    'output_ports': define_output_ports(method_doc),
+                    'doc_string': _function_source(method)}
+        except Exception as e:
+            logger.warn("%s failed scraping on %s.%s",
+                        e, module_path, func_name)
+
+    return {'class_name': class_name,
+            'module_path': module_path,
+            'constructor': constructor,
+            'methods': method_specs}
+
+
 def scrape_module(module_path, black_list=None,
                   exclude_markers=None,
-                  exclude_private=True):
+                  exclude_private=True,
+                  cache_dir=None,
+                  defer_source=False,
+                  previous=None):
     """
     Attempt to scrape all functions from a module.
 
@@ -767,6 +1081,21 @@ def scrape_module(module_path, black_list=None,
     exclude_private : bool
         If True, do not scrape private (prefixed by '_') functions
 
+    cache_dir : str or None, optional
+        Directory of the persistent spec cache.  If given, the specs are
+        loaded from the cache when the module (and the package it belongs
+        to) is unchanged since the specs were stored, and written back
+        to the cache after scraping otherwise.  See `SPEC_CACHE_DIR` for
+        the conventional location.
+
+    defer_source : bool, optional
+        Passed on to `scrape_function`
+
+    previous : dict, optional
+        Result of an earlier `scrape_module_incremental` call for this
+        module.  Only the functions whose docstring or signature changed
+        since then are parsed again.  When a stale cache entry is found
+        in `cache_dir` it is used in the same way.
 
     Returns
     -------
@@ -785,6 +1114,174 @@ def scrape_module(module_path, black_list=None,
     black_list = set(black_list)
 
     # grab the module from it's name
+    with startup_timer(module_path, 'import'):
+        mod = importlib.import_module(module_path)
+
+    if cache_dir is not None:
+        cache_key = _spec_cache_key(mod, black_list, exclude_markers,
+                                    exclude_private, defer_source)
+        cache_file = _spec_cache_file(cache_dir, module_path)
+        with startup_timer(module_path, 'cache'):
+            cached = _load_spec_cache(cache_file)
+        if cached is not None and cached['key'] == cache_key:
+            logger.debug("loaded %d cached specs for %s",
+                         len(cached['specs']), module_path)
+            return cached['specs']
+        if (previous is None and cached is not None and
+                cached['key']['defer_source'] == defer_source):
+            # the library changed, re-use what we can
+            previous = cached
+
+    record = scrape_module_incremental(module_path, previous=previous,
+                                       black_list=black_list,
+                                       exclude_markers=exclude_markers,
+                                       exclude_private=exclude_private,
+                                       defer_source=defer_source)
+    if previous is not None:
+        logger.info("re-scraped %s: %d added, %d removed, %d changed",
+                    module_path, len(record['added']),
+                    len(record['removed']), len(record['changed']))
+
+    if cache_dir is not None:
+        _store_spec_cache(cache_file, cache_key, record)
+
+    return record['specs']
+
+
+def scrape_module_incremental(module_path, previous=None, black_list=None,
+                              exclude_markers=None, exclude_private=True,
+                              defer_source=False):
+    """
+    Scrape a module, re-using the specs of unchanged functions
+
+    Each function is hashed on its docstring and signature (see
+    `_function_hash`).  Functions whose hash matches the one recorded in
+    `previous` keep their previous spec, the rest are scraped.
+
+    Parameters
+    ----------
+    module_path : str
+        The module to scrape
+
+    previous : dict, optional
+        The return value of an earlier call for the same module (and the
+        same `defer_source`).  If None, every function is scraped.
+
+    black_list, exclude_markers, exclude_private, defer_source
+        See `scrape_module`
+
+    Returns
+    -------
+    record : dict
+        'specs' : the same as the return value of `scrape_module`
+        'hashes' : dict of function name to hash of the scraped functions
+        'added' : names of the functions that were not in `previous`
+        'removed' : names of the functions in `previous` that are gone
+        'changed' : names of the functions whose hash changed
+    """
+    if previous is None:
+        previous = {'specs': {}, 'hashes': {}}
+    prev_specs = previous['specs']
+    prev_hashes = previous['hashes']
+
+    mod = importlib.import_module(module_path)
+    funcs_to_wrap = list_functions(module_path, black_list=black_list,
+                                   exclude_markers=exclude_markers,
+                                   exclude_private=exclude_private)
+
+    specs = dict()
+    hashes = dict()
+    added = []
+    changed = []
+    for ftw in funcs_to_wrap:
+        try:
+            func_hash = _function_hash(getattr(mod, ftw))
+        except Exception as e:
+            logger.warn("%s failed hashing on %s.%s",
+                        e, module_path, ftw)
+            continue
+        if ftw in prev_specs and prev_hashes.get(ftw) == func_hash:
+            specs[ftw] = prev_specs[ftw]
+            hashes[ftw] = func_hash
+            continue
+        if ftw in prev_specs:
+            changed.append(ftw)
+        else:
+            added.append(ftw)
+        try:
+            spec_dict = scrape_function(ftw, module_path,
+                                        defer_source=defer_source)
+            specs[ftw] = spec_dict
+            hashes[ftw] = func_hash
+        except Exception as e:
+            logger.warn("%s failed scraping on %s.%s",
+                        e, module_path, ftw)
+
+    removed = sorted(set(prev_specs) - set(funcs_to_wrap))
+    return {'specs': specs,
+            'hashes': hashes,
+            'added': added,
+            'removed': removed,
+            'changed': changed}
+
+
+def _function_hash(func):
+    """
+    Hash the parts of a function that its scraped spec depends on
+
+    Parameters
+    ----------
+    func : callable
+
+    Returns
+    -------
+    hash : str
+        Hex digest of the docstring, signature and type of `func`
+    """
+    try:
+        if hasattr(inspect, 'signature'):
+            signature = inspect.signature(func)
+        else:
+            signature = inspect.getargspec(func)
+    except (TypeError, ValueError):
+        # builtins without a signature and, for getargspec, functions
+        # with keyword-only arguments
+        signature = None
+    func_hash = hashlib.sha1()
+    for part in (func.__doc__, signature, type(func).__name__):
+        func_hash.update(six.text_type(part).encode('utf-8'))
+    return func_hash.hexdigest()
+
+
+def list_functions(module_path, black_list=None, exclude_markers=None,
+                   exclude_private=True):
+    """
+    List the functions of a module that `scrape_module` would scrape
+
+    This only looks at the names and types of the module attributes, no
+    docstrings are parsed.
+
+    Parameters
+    ----------
+    module_path : str
+        The module to inspect
+
+    black_list, exclude_markers, exclude_private
+        See `scrape_module`
+
+    Returns
+    -------
+    func_names : list
+        Names of the candidate functions in `module_path`
+    """
+    if black_list is None:
+        black_list = []
+
+    if exclude_markers is None:
+        exclude_markers = []
+
+    black_list = set(black_list)
+
     mod = importlib.import_module(module_path)
 
     if hasattr(mod, '__all__'):
@@ -814,13 +1311,219 @@ def scrape_module(module_path, black_list=None,
 
         funcs_to_wrap.append(atr_name)
 
-    ret = dict()
-    for ftw in funcs_to_wrap:
+    return funcs_to_wrap
+
+
+def scrape_modules(module_paths, processes=None, **kwargs):
+    """
+    Scrape several modules, optionally fanning out over worker processes
+
+    The modules are independent of each other so they can be scraped
+    concurrently.  The results are always merged in the order of
+    `module_paths` so that downstream wrapping is deterministic.
+
+    Parameters
+    ----------
+    module_paths : list
+        The modules to scrape
+
+    processes : int or None, optional
+        Number of worker processes to use.  None uses one per CPU and 1
+        scrapes serially in this process.  The specs that can not be sent
+        back from a worker process are scraped again in this process, so
+        the result does not depend on `processes`.
+
+    kwargs
+        Passed through to `scrape_module`
+
+    Returns
+    -------
+    mod_specs : OrderedDict
+        Keyed on module path (in the order of `module_paths`) with the
+        output of `scrape_module` as values.  Modules that fail to import
+        or scrape are logged and map to an empty dict.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(module_paths)))
+
+    if processes == 1:
+        results = [_scrape_module_worker((mod_path, kwargs, False))
+                   for mod_path in module_paths]
+    else:
+        jobs = [(mod_path, kwargs, True) for mod_path in module_paths]
+        pool = multiprocessing.Pool(processes)
         try:
-            spec_dict = scrape_function(ftw, module_path)
-            ret[ftw] = spec_dict
+            # map preserves the order of the jobs
+            results = pool.map(_scrape_module_worker, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        # collect the timings recorded in the worker processes
+        for mod_path, specs, timings, dropped in results:
+            profiling.merge_startup_report(timings)
+            for func_name in dropped:
+                try:
+                    specs[func_name] = scrape_function(
+                        func_name, mod_path,
+                        defer_source=kwargs.get('defer_source', False))
+                except Exception as e:
+                    logger.warn("%s failed scraping on %s.%s",
+                                e, mod_path, func_name)
+
+    return OrderedDict((mod_path, specs)
+                       for mod_path, specs, timings, dropped in results)
+
+
+def _scrape_module_worker(job):
+    """
+    Scrape one module for `scrape_modules`
+
+    This must live at module level so that it can be sent to the worker
+    processes.
+
+    Parameters
+    ----------
+    job : tuple
+        (module_path, scrape_module kwargs, bool).  The flag is true when
+        running in a worker process: specs that can not be pickled (and
+        so not be sent back to the parent process) are left out and the
+        timings recorded by this job are returned.
+
+    Returns
+    -------
+    module_path : str
+    specs : dict
+    timings : dict
+        The part of `profiling.startup_report` recorded by this job, only
+        filled in when running in a worker process
+    dropped : list
+        Names of the functions whose spec could not be pickled, for the
+        parent process to scrape
+    """
+    module_path, kwargs, in_worker = job
+    if in_worker:
+        # a worker process can run several jobs
+        profiling.reset_startup_report()
+    try:
+        specs = scrape_module(module_path, **kwargs)
+    except Exception as e:
+        logger.warn("%s failed scraping module %s", e, module_path)
+        specs = {}
+    if not in_worker:
+        return module_path, specs, {}, []
+
+    dropped = []
+    for func_name in list(specs):
+        try:
+            pickle.dumps(specs[func_name], protocol=2)
         except Exception as e:
-            logger.warn("%s failed scraping on %s.%s",
-                        e, module_path, ftw)
+            logger.debug("%s, %s.%s is scraped in the parent process",
+                         e, module_path, func_name)
+            del specs[func_name]
+            dropped.append(func_name)
+    return module_path, specs, profiling.startup_report(), dropped
+
+
+def clear_spec_cache(cache_dir=SPEC_CACHE_DIR):
+    """Remove all of the cached module specs from `cache_dir`
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        The spec cache directory.  Defaults to `SPEC_CACHE_DIR`
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    for fname in os.listdir(cache_dir):
+        if fname.endswith(_SPEC_CACHE_EXT):
+            os.remove(os.path.join(cache_dir, fname))
+
+
+def _spec_cache_file(cache_dir, module_path):
+    """The file which holds the cached specs of `module_path`
+    """
+    return os.path.join(cache_dir, module_path + _SPEC_CACHE_EXT)
+
+
+def _spec_cache_key(mod, black_list, exclude_markers, exclude_private,
+                    defer_source):
+    """
+    Build the key that a cached scrape of `mod` must match to be re-used
+
+    The key captures the version of the package that `mod` belongs to
+    and the modification times of the module and package files (so that
+    upgrading or editing the library invalidates the cache) as well as
+    the options that change which functions get scraped.
+
+    Parameters
+    ----------
+    mod : module
+        The (already imported) module being scraped
+
+    black_list, exclude_markers, exclude_private, defer_source
+        See `scrape_module`
+
+    Returns
+    -------
+    key : dict
+        Comparable description of the scraped module
+    """
+    pkg_name = mod.__name__.split('.')[0]
+    pkg = sys.modules.get(pkg_name, mod)
+    mtimes = []
+    for src_file in sorted(set(getattr(m, '__file__', None) or ''
+                               for m in (mod, pkg))):
+        if not src_file:
+            continue
+        try:
+            mtimes.append((src_file, os.path.getmtime(src_file)))
+        except OSError:
+            mtimes.append((src_file, None))
+
+    return {'format': _SPEC_CACHE_FORMAT,
+            'python': tuple(sys.version_info[:2]),
+            'module': mod.__name__,
+            'version': str(getattr(pkg, '__version__', None)),
+            'mtimes': mtimes,
+            'black_list': sorted(black_list),
+            'exclude_markers': sorted(exclude_markers),
+            'exclude_private': bool(exclude_private),
+            'defer_source': bool(defer_source)}
+
+
+def _load_spec_cache(cache_file):
+    """
+    Load the record stored in `cache_file`, or None if there is no
+    (readable) cache file.  The caller checks the 'key' of the record.
+    """
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            cached = pickle.load(f)
+    except Exception as e:
+        # a corrupt or unreadable cache is never fatal, just re-scrape
+        logger.warning("could not read spec cache %s: %s", cache_file, e)
+        return None
+    if cached.get('key', {}).get('format') != _SPEC_CACHE_FORMAT:
+        logger.debug("spec cache %s has an old format", cache_file)
+        return None
+    return cached
+
+
+def _store_spec_cache(cache_file, cache_key, record):
+    """
+    Write the specs and hashes of a `scrape_module_incremental` record
+    to `cache_file` under `cache_key`
+    """
+    try:
+        dump_pickle({'key': cache_key,
+                     'specs': record['specs'],
+                     'hashes': record['hashes']}, cache_file)
+    except Exception as e:
+        # default values that can not be pickled end up here
+        logger.warning("could not write spec cache %s: %s", cache_file, e)
+
 
-    return ret
+_SPEC_CACHE_EXT = '.pkl'
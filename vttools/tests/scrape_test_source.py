@@ -71,3 +71,42 @@ def _private():
 
 class DontWrapMe(object):
     pass
+
+
+class Porridge(object):
+    """
+    A bowl of porridge
+
+    Parameters
+    ----------
+    temperature : float
+        How hot the porridge is
+    size : int, optional
+        Size of the bowl
+    """
+    def __init__(self, temperature, size=1):
+        self.temperature = temperature
+        self.size = size
+
+    def cool(self, delta):
+        """
+        Let the porridge cool down
+
+        Parameters
+        ----------
+        delta : float
+            Drop of the temperature
+
+        Returns
+        -------
+        temperature : float
+            The new temperature
+        """
+        self.temperature -= delta
+        return self.temperature
+
+    def eat(self):
+        """
+        Eat the porridge
+        """
+        self.size = 0
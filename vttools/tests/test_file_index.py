@@ -0,0 +1,218 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+
+from __future__ import (absolute_import, division, print_function,
+                        )
+import six
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import shutil
+import tempfile
+from nose.tools import assert_equal, assert_true, assert_false
+
+from vttools import file_index
+from vttools.file_index import FileIndex
+
+
+def _touch(*parts):
+    path = os.path.join(*parts)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    open(path, 'w').close()
+    return path
+
+
+def _age(path, seconds=10):
+    # push the mtime of a directory past the mtime resolution
+    mtime = os.stat(path).st_mtime - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def _age_tree(root):
+    for dir_path, _, _ in os.walk(root):
+        _age(dir_path)
+
+
+def test_find_and_refresh():
+    root = tempfile.mkdtemp()
+    index_dir = tempfile.mkdtemp()
+    try:
+        a = _touch(root, 'a', 'data.tif')
+        b = _touch(root, 'b', 'c', 'data.tif')
+        _touch(root, 'b', 'other.npy')
+        _age_tree(root)
+
+        index = FileIndex(root, index_dir=index_dir)
+        stats = index.build()
+        assert_equal(stats['dirs'], 4)
+        assert_equal(stats['rescanned'], 4)
+        assert_equal(index.find('data.tif'), [a, b])
+        assert_equal(index.find('missing.tif'), [])
+
+        # nothing changed, nothing is listed again
+        assert_equal(index.refresh()['rescanned'], 0)
+
+        # a new file, a removed file and a removed directory
+        d = _touch(root, 'a', 'd', 'data.tif')
+        os.remove(a)
+        shutil.rmtree(os.path.join(root, 'b', 'c'))
+        for dir_path in ('a', os.path.join('a', 'd'), 'b'):
+            _age(os.path.join(root, dir_path))
+        stats = index.refresh()
+        assert_equal(stats['dirs'], 4)
+        # a, b and the new a/d, not the root
+        assert_equal(stats['rescanned'], 3)
+        assert_equal(index.find('data.tif'), [d])
+        assert_equal(index.find('other.npy'),
+                     [os.path.join(root, 'b', 'other.npy')])
+
+        # the stored index is up to date
+        stored = FileIndex(root, index_dir=index_dir)
+        assert_true(stored.load())
+        assert_equal(stored.find('data.tif'), [d])
+        assert_equal(stored.refresh()['rescanned'], 0)
+        assert_false(FileIndex(root + 'x', index_dir=index_dir).load())
+    finally:
+        shutil.rmtree(root)
+        shutil.rmtree(index_dir)
+
+
+def test_recent_dirs_rescanned():
+    root = tempfile.mkdtemp()
+    try:
+        index = FileIndex(root, index_dir=None)
+        index.build()
+        # the mtime of root is too recent to be trusted
+        assert_equal(index.refresh()['rescanned'], 1)
+        _age(root)
+        index.refresh()
+        assert_equal(index.refresh()['rescanned'], 0)
+    finally:
+        shutil.rmtree(root)
+
+
+def test_index_dir_under_root():
+    root = tempfile.mkdtemp()
+    try:
+        index_dir = os.path.join(root, '.vttools', 'file_index')
+        os.makedirs(index_dir)
+        _touch(root, 'a', 'data.tif')
+        _age_tree(root)
+        index = FileIndex(root, index_dir=index_dir)
+        index.build()
+        assert_true(os.path.exists(index.index_file))
+        # storing the index does not make it stale
+        assert_equal(index.refresh()['rescanned'], 0)
+        assert_equal(index.refresh()['rescanned'], 0)
+        assert_equal(index.find(os.path.basename(index.index_file)), [])
+    finally:
+        shutil.rmtree(root)
+
+
+class _CountRefresh(FileIndex):
+    def __init__(self, *args, **kwargs):
+        super(_CountRefresh, self).__init__(*args, **kwargs)
+        self.refreshes = 0
+
+    def refresh(self):
+        self.refreshes += 1
+        return super(_CountRefresh, self).refresh()
+
+
+def test_lookup():
+    root = tempfile.mkdtemp()
+    try:
+        path = _touch(root, 'a', 'data.tif')
+        _age_tree(root)
+        index = _CountRefresh(root, index_dir=None)
+        index.build()
+        # a hit right after the build is not refreshed
+        assert_equal(index.lookup('data.tif'), [path])
+        assert_equal(index.refreshes, 1)
+
+        # a miss is
+        new = _touch(root, 'b', 'new.tif')
+        assert_equal(index.lookup('new.tif'), [new])
+        assert_equal(index.refreshes, 2)
+
+        # so is a stale hit
+        os.remove(path)
+        demo = _touch(root, 'Demos', 'data.tif')
+        assert_equal(index.lookup('data.tif'), [demo])
+        assert_equal(index.refreshes, 3)
+
+        # and a hit once the last refresh is too old
+        other = _touch(root, 'a', 'new.tif')
+        assert_equal(index.lookup('new.tif'), [new])
+        assert_equal(index.refreshes, 3)
+        assert_equal(index.lookup('new.tif', max_age=0), [other, new])
+        assert_equal(index.refreshes, 4)
+
+        # a loaded index is refreshed on its first lookup
+        index = _CountRefresh(root, index_dir=None)
+        assert_equal(index.lookup('new.tif'), [other, new])
+        assert_equal(index.refreshes, 1)
+    finally:
+        shutil.rmtree(root)
+
+
+def test_file_index_api():
+    root = tempfile.mkdtemp()
+    index_dir = tempfile.mkdtemp()
+    try:
+        path = _touch(root, 'Demos', 'sample.tif')
+        index = file_index.get_file_index(root, index_dir=index_dir)
+        assert_equal(index.find('sample.tif'), [path])
+        assert_true(file_index.get_file_index(root, index_dir=index_dir)
+                    is index)
+        assert_true(os.path.exists(index.index_file))
+
+        new = _touch(root, 'new.tif')
+        _age(root)
+        file_index.build_file_index(root, index_dir=index_dir)
+        assert_equal(index.find('new.tif'), [new])
+        stats = file_index.build_file_index(root, index_dir=index_dir,
+                                            rebuild=True)
+        assert_equal(stats['rescanned'], 2)
+
+        file_index.clear_file_index(index_dir)
+        assert_equal(os.listdir(index_dir), [])
+        assert_false(file_index.get_file_index(root, index_dir=index_dir)
+                     is index)
+    finally:
+        shutil.rmtree(root)
+        shutil.rmtree(index_dir)
@@ -0,0 +1,152 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import six
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from numpy.testing import assert_array_equal, assert_raises
+from nose.tools import assert_equal, assert_true
+from tifffile import imsave
+
+from vttools.frame_stack import LazyFrameStack
+
+
+def _write_frames(frames, ext, **kwargs):
+    tmp_dir = tempfile.mkdtemp()
+    files = []
+    for idx, frame in enumerate(frames):
+        fname = os.path.join(tmp_dir, 'frame_{0:03d}{1}'.format(idx, ext))
+        if ext == '.npy':
+            np.save(fname, frame)
+        else:
+            imsave(fname, frame, **kwargs)
+        files.append(fname)
+    return tmp_dir, files
+
+
+def _check_indexing(ext, memmap, kwargs):
+    frames = np.arange(10 * 6 * 5, dtype=np.uint16).reshape(10, 6, 5)
+    tmp_dir, files = _write_frames(frames, ext, **kwargs)
+    try:
+        stack = LazyFrameStack(files, memmap=memmap)
+        assert_equal(stack.shape, frames.shape)
+        assert_equal(stack.dtype, frames.dtype)
+        assert_equal(stack.ndim, 3)
+        assert_equal(len(stack), 10)
+        assert_array_equal(stack[3], frames[3])
+        assert_array_equal(stack[-1], frames[-1])
+        assert_array_equal(stack[2:8:2], frames[2:8:2])
+        assert_array_equal(stack[[1, 4]], frames[[1, 4]])
+        assert_array_equal(stack[5, 1:3, 2], frames[5, 1:3, 2])
+        assert_array_equal(stack[:, 0, 0], frames[:, 0, 0])
+        assert_array_equal(np.asarray(stack), frames)
+        for frame, expected in zip(stack, frames):
+            assert_array_equal(frame, expected)
+        assert_raises(IndexError, stack.__getitem__, 10)
+        assert_raises(IndexError, stack.__getitem__, -11)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_indexing():
+    for ext, kwargs in (('.tif', {}), ('.tif', {'compress': 6}),
+                        ('.npy', {})):
+        for memmap in (True, False):
+            yield _check_indexing, ext, memmap, kwargs
+
+
+def test_frame_cache():
+    frames = np.arange(8 * 16 * 16, dtype=np.float64).reshape(8, 16, 16)
+    frame_bytes = frames[0].nbytes
+    tmp_dir, files = _write_frames(frames, '.tif', compress=6)
+    try:
+        stack = LazyFrameStack(files, cache_bytes=3 * frame_bytes)
+        for idx in range(8):
+            assert_array_equal(stack[idx], frames[idx])
+        info = stack.cache_info()
+        assert_equal(info['misses'], 8)
+        assert_equal(info['hits'], 0)
+        # only the most recent frames fit in the budget
+        assert_equal(info['size'], 3)
+        assert_equal(info['nbytes'], 3 * frame_bytes)
+        assert_equal(info['max_bytes'], 3 * frame_bytes)
+        stack[7]
+        stack[5]
+        assert_equal(stack.cache_info()['hits'], 2)
+        # frame 6 is now the least recently used
+        stack[0]
+        stack[6]
+        assert_equal(stack.cache_info()['misses'], 10)
+        stack.clear_cache()
+        info = stack.cache_info()
+        assert_equal((info['size'], info['nbytes']), (0, 0))
+
+        # frames bigger than the budget are not cached
+        stack = LazyFrameStack(files, cache_bytes=frame_bytes - 1)
+        stack[0]
+        assert_equal(stack.cache_info()['size'], 0)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_memmap_not_cached():
+    frames = np.arange(4 * 6 * 5, dtype=np.uint8).reshape(4, 6, 5)
+    tmp_dir, files = _write_frames(frames, '.npy')
+    try:
+        stack = LazyFrameStack(files)
+        assert_true(isinstance(stack[1], np.memmap))
+        assert_equal(stack.cache_info()['size'], 0)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_bad_frames():
+    assert_raises(ValueError, LazyFrameStack, [])
+    assert_raises(ValueError, LazyFrameStack, ['frame.png'])
+    tmp_dir, files = _write_frames([np.zeros((4, 4), dtype=np.uint8),
+                                    np.zeros((4, 5), dtype=np.uint8)], '.npy')
+    try:
+        stack = LazyFrameStack(files)
+        stack[0]
+        assert_raises(ValueError, stack.__getitem__, 1)
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,130 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import six
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_raises
+from nose.tools import assert_equal
+
+from vttools import fusion
+
+
+def _normalize_steps():
+    return [(np.subtract, ('frame', 'dark')),
+            (np.divide, (0, 'flat')),
+            (np.log, (1, )),
+            (np.multiply, (2, 'scale'))]
+
+
+def _normalize_inputs(shape):
+    rs = np.random.RandomState(0)
+    return {'frame': rs.rand(*shape) + 2,
+            'dark': rs.rand(*shape[1:]),
+            'flat': rs.rand(1, *shape[1:]) + 1,
+            'scale': 3.}
+
+
+def _normalize(frame, dark, flat, scale):
+    return np.log((frame - dark) / flat) * scale
+
+
+def test_fused_ufunc():
+    for use_numexpr in (False, True):
+        fused = fusion.FusedUfunc(_normalize_steps(), use_numexpr=use_numexpr)
+        assert_equal(fused.input_names, ['frame', 'dark', 'flat', 'scale'])
+        # small inputs in one go, large ones block by block
+        for shape in [(3, 4), (64, 128, 32)]:
+            inputs = _normalize_inputs(shape)
+            yield (assert_array_almost_equal, fused(**inputs),
+                   _normalize(**inputs))
+
+
+def test_fused_integer_inputs():
+    fused = fusion.FusedUfunc([(np.add, ('a', 'b')),
+                               (np.right_shift, (0, 'c'))])
+    # right_shift has no numexpr counterpart
+    assert_equal(fused.expression, None)
+    a = np.arange(2 ** 17).reshape(2 ** 9, 2 ** 8)
+    assert_array_almost_equal(fused(a=a, b=a, c=1), a)
+
+
+def test_fused_ufunc_errors():
+    assert_raises(ValueError, fusion.FusedUfunc, [(np.frexp, ('a', ))])
+    assert_raises(ValueError, fusion.FusedUfunc, [(np.add, ('a', ))])
+    assert_raises(ValueError, fusion.FusedUfunc, [(np.log, (0, ))])
+    assert_raises(TypeError, fusion.FusedUfunc, [(np.sum, ('a', ))])
+    fused = fusion.FusedUfunc([(np.add, ('a', 'b'))])
+    assert_raises(TypeError, fused, a=1)
+
+
+def test_numexpr_expression():
+    fused = fusion.FusedUfunc(_normalize_steps())
+    assert_equal(fused.expression, '(log(((frame - dark) / flat)) * scale)')
+
+
+def test_find_ufunc_chains():
+    ufuncs = {'read': None,
+              'sub': np.subtract,
+              'div': np.divide,
+              'log': np.log,
+              'plot': None,
+              'sqrt': np.sqrt,
+              'sin': np.sin,
+              'cos': np.cos}
+    edges = [('read', 'sub'), ('sub', 'div'), ('div', 'log'),
+             ('log', 'plot'),
+             # sqrt feeds two modules, so it ends its chain
+             ('read', 'sqrt'), ('sqrt', 'sin'), ('sqrt', 'cos'),
+             ('sin', 'plot')]
+    assert_equal(fusion.find_ufunc_chains(ufuncs, edges),
+                 [['sub', 'div', 'log']])
+    edges.remove(('sqrt', 'cos'))
+    assert_equal(sorted(fusion.find_ufunc_chains(ufuncs, edges)),
+                 [['sqrt', 'sin'], ['sub', 'div', 'log']])
+
+    # add is fed by two chains, it starts its own so that no node is
+    # evaluated twice
+    ufuncs = {'a': np.sqrt, 'b': np.sin, 'add': np.add, 'log': np.log,
+              'exp': np.exp}
+    edges = [('a', 'add'), ('b', 'add'), ('add', 'log')]
+    assert_equal(fusion.find_ufunc_chains(ufuncs, edges), [['add', 'log']])
+    edges = [('exp', 'a'), ('a', 'add'), ('b', 'add'), ('add', 'log')]
+    assert_equal(sorted(fusion.find_ufunc_chains(ufuncs, edges)),
+                 [['add', 'log'], ['exp', 'a']])
@@ -0,0 +1,142 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import six
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from numpy.testing import assert_array_equal, assert_raises
+from nose.tools import assert_equal, assert_true
+from tifffile import imsave
+
+from vttools import image_io
+
+
+def _write_frames(frames):
+    tmp_dir = tempfile.mkdtemp()
+    files = []
+    for idx, frame in enumerate(frames):
+        fname = os.path.join(tmp_dir, 'frame_{0:03d}.tif'.format(idx))
+        imsave(fname, frame)
+        files.append(fname)
+    return tmp_dir, files
+
+
+def test_read_tiff_stack():
+    frames = np.arange(12 * 6 * 5, dtype=np.uint16).reshape(12, 6, 5)
+    tmp_dir, files = _write_frames(frames)
+    try:
+        for workers in (1, 4, None):
+            stack, stats = image_io.read_tiff_stack(files, workers=workers)
+            assert_array_equal(stack, frames)
+            assert_equal(stack.dtype, frames.dtype)
+            assert_equal([fname for fname, _, _ in stats['files']], files)
+            assert_equal(stats['bytes'], frames.nbytes)
+            assert_true(stats['throughput'] > 0)
+        # compressed frames are decoded into the stack as well
+        imsave(files[-1], frames[-1], compress=6)
+        stack, _ = image_io.read_tiff_stack(files, workers=4)
+        assert_array_equal(stack, frames)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_read_tiff_stack_mismatch():
+    tmp_dir, files = _write_frames([np.zeros((4, 4), dtype=np.uint8),
+                                    np.zeros((4, 5), dtype=np.uint8)])
+    try:
+        assert_raises(ValueError, image_io.read_tiff_stack, files)
+        assert_raises(ValueError, image_io.read_tiff_stack, [])
+    finally:
+        shutil.rmtree(tmp_dir)
+    # frames of the same size are not reshaped or cast into the stack
+    for other in (np.zeros(20, dtype=np.uint16),
+                  np.zeros((4, 5), dtype=np.int16)):
+        tmp_dir, files = _write_frames([np.zeros((4, 5), dtype=np.uint16),
+                                        other])
+        try:
+            assert_raises(ValueError, image_io.read_tiff_stack, files)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+def test_map_tiff_frames():
+    frames = np.arange(3 * 6 * 5, dtype=np.float32).reshape(3, 6, 5)
+    tmp_dir, files = _write_frames(frames)
+    compressed = os.path.join(tmp_dir, 'compressed.tif')
+    imsave(compressed, frames[0], compress=6)
+    try:
+        mapped = image_io.map_tiff_frames(files)
+        for frame, expected in zip(mapped, frames):
+            assert_true(isinstance(frame, np.memmap))
+            assert_array_equal(frame, expected)
+        # compressed pages are decoded instead
+        assert_equal(image_io.memmap_tiff(compressed), None)
+        frame, = image_io.map_tiff_frames([compressed])
+        assert_array_equal(frame, frames[0])
+        del mapped, frame
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_load_numpy():
+    tmp_dir = tempfile.mkdtemp()
+    arr = np.arange(20.).reshape(4, 5)
+    try:
+        base = os.path.join(tmp_dir, 'saved')
+        np.save(base + '.npy', arr)
+        np.savez(os.path.join(tmp_dir, 'archive.npz'), first=arr,
+                 second=2 * arr)
+        # the extension is optional
+        for fname in (base, base + '.npy'):
+            loaded, = image_io.load_numpy(fname)
+            assert_array_equal(loaded, arr)
+        loaded, = image_io.load_numpy(base, mmap_mode='r')
+        assert_true(isinstance(loaded, np.memmap))
+        assert_array_equal(loaded, arr)
+        del loaded
+
+        first, second = image_io.load_numpy(os.path.join(tmp_dir,
+                                                         'archive'))
+        assert_array_equal(first, arr)
+        assert_array_equal(second, 2 * arr)
+    finally:
+        shutil.rmtree(tmp_dir)
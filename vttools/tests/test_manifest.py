@@ -0,0 +1,139 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import six
+import logging
+logger = logging.getLogger(__name__)
+
+import gzip
+import os
+import shutil
+import tempfile
+from six.moves import cPickle as pickle
+
+from nose.tools import assert_equal, assert_true, raises
+
+import vttools
+from vttools import manifest
+
+
+_import_dict = {'autowrap_module': ['vttools.tests.scrape_test_source'],
+                'scrape_black_list': ['has_defaults'],
+                'autowrap_func': [{'func_name': 'has_defaults',
+                                   'module_path':
+                                       'vttools.tests.scrape_test_source',
+                                   'namespace': 'test'},
+                                  # the same module as the scraped one
+                                  {'func_name': 'porridge_for_the_bears',
+                                   'module_path':
+                                       'vttools.tests.scrape_test_source',
+                                   'namespace':
+                                       'vttools.tests.scrape_test_source',
+                                   'add_input_dict': True}]}
+
+
+def test_manifest_round_trip():
+    entries = manifest.build_manifest(_import_dict, processes=1)
+    names = [(e['func_name'], e.get('namespace')) for e in entries]
+    assert_true(('eat_porridge', None) in names)
+    # black listed from the module scrape, but explicitly autowrapped
+    assert_true(('has_defaults', 'test') in names)
+    assert_equal(len(names), len(set(names)))
+    # the explicit entry replaces the scraped one
+    porridge = [e for e in entries
+                if e['func_name'] == 'porridge_for_the_bears']
+    assert_equal(len(porridge), 1)
+    assert_true(porridge[0]['add_input_dict'])
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(tmp_dir, 'manifest.pkl.gz')
+        manifest.write_manifest(entries, fname)
+        assert_equal(manifest.read_manifest(fname), entries)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_manifest_versions():
+    entries = [{'func_name': 'has_defaults',
+                'module_path': 'vttools.tests.scrape_test_source'}]
+    tmp_dir = tempfile.mkdtemp()
+    handler = _ListHandler()
+    manifest.logger.addHandler(handler)
+    try:
+        fname = os.path.join(tmp_dir, 'manifest.pkl.gz')
+        manifest.write_manifest(entries, fname)
+        with gzip.open(fname, 'rb') as f:
+            stored = pickle.load(f)
+        assert_equal(stored['versions'], {'vttools': vttools.__version__})
+        manifest.read_manifest(fname)
+        assert_equal(handler.messages, [])
+
+        # built against another version of the library
+        stored['versions']['vttools'] = 'old'
+        with gzip.open(fname, 'wb') as f:
+            pickle.dump(stored, f, protocol=2)
+        assert_equal(manifest.read_manifest(fname), entries)
+        assert_equal(len(handler.messages), 1)
+        assert_true('vttools old' in handler.messages[0])
+    finally:
+        manifest.logger.removeHandler(handler)
+        shutil.rmtree(tmp_dir)
+
+
+@raises(ValueError)
+def test_manifest_format():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(tmp_dir, 'manifest.pkl.gz')
+        manifest.write_manifest([], fname)
+        manifest._MANIFEST_FORMAT += 1
+        try:
+            manifest.read_manifest(fname)
+        finally:
+            manifest._MANIFEST_FORMAT -= 1
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,128 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import six
+import logging
+logger = logging.getLogger(__name__)
+
+from nose.tools import assert_equal, assert_true
+
+from vttools import profiling, scrape
+
+
+def test_startup_report():
+    profiling.reset_startup_report()
+    mod_name = 'vttools.tests.scrape_test_source'
+    scrape.scrape_module(mod_name)
+    report = profiling.startup_report()
+    assert_true('import' in report[mod_name])
+    stages = report[mod_name]['functions']['eat_porridge']
+    for stage in ('parse', 'source', 'ports'):
+        assert_true(stage in stages)
+
+    # merging a report adds to the recorded times
+    profiling.merge_startup_report(report)
+    assert_equal(profiling.startup_report()[mod_name]['functions']
+                 ['eat_porridge']['parse'], 2 * stages['parse'])
+
+    modules, functions = profiling.startup_summary(n=2)
+    assert_equal([name for t, name in modules], [mod_name])
+    assert_equal(len(functions), 2)
+    assert_true(functions[0][0] >= functions[1][0])
+    profiling.reset_startup_report()
+    assert_equal(profiling.startup_report(), {})
+
+
+class _Port(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeModule(object):
+    # the parts of a VisTrails module that the instrumentation uses
+    _input_ports = [_Port('data'), _Port('unset')]
+
+    def __init__(self, data):
+        self.inputs = {'data': data}
+        self.outputs = {}
+
+    def has_input(self, name):
+        return name in self.inputs
+
+    def get_input(self, name):
+        return self.inputs[name]
+
+
+def _fake_compute(self):
+    self.outputs['doubled'] = [2 * x for x in self.get_input('data')]
+
+
+def test_execution_profiling():
+    profiling.reset_execution_report()
+    # disabled: compute is returned as-is
+    assert_true(profiling.profile_compute('fake', _fake_compute) is
+                _fake_compute)
+
+    profiling.enable_execution_profiling()
+    try:
+        compute = profiling.profile_compute('fake', _fake_compute)
+    finally:
+        profiling.disable_execution_profiling()
+    assert_true(compute is not _fake_compute)
+    for _ in range(3):
+        compute(_FakeModule(list(range(1000))))
+
+    entry = profiling.execution_report()['fake']
+    assert_equal(entry['calls'], 3)
+    assert_true(entry['total_time'] >= entry['max_time'] >= 0)
+    assert_true(entry['in_bytes'] > 0)
+    assert_true(entry['out_bytes'] > 0)
+    table = profiling.format_execution_report()
+    assert_true('fake' in table.splitlines()[1])
+    profiling.reset_execution_report()
+    assert_equal(profiling.execution_report(), {})
+
+
+def test_coercion_report():
+    profiling.reset_coercion_report()
+    for outcome in ('converted', 'converted', 'passthrough'):
+        profiling.record_coercion('mod.port', outcome)
+    assert_equal(profiling.coercion_report(),
+                 {'mod.port': {'passthrough': 1, 'converted': 2,
+                               'skipped': 0, 'failed': 0}})
+    profiling.reset_coercion_report()
+    assert_equal(profiling.coercion_report(), {})
@@ -0,0 +1,156 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import six
+import functools
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+from numpy.testing import assert_array_equal
+from nose.tools import assert_equal, assert_true, assert_not_equal
+
+from vttools import result_cache
+
+
+# arguments of the calls of `_scale`
+_SCALE_CALLS = []
+
+
+def _scale(arr, scale=1):
+    _SCALE_CALLS.append(scale)
+    return arr * scale
+
+
+class _Scaler(object):
+    def __init__(self, scale):
+        self.scale = scale
+
+    def __call__(self, arr):
+        return arr * self.scale
+
+
+def test_result_key():
+    arr = np.arange(12, dtype=float).reshape(3, 4)
+    key = result_cache.result_key(np.sum, (arr, ), {'axis': 0})
+    # same content, different buffer
+    assert_equal(key, result_cache.result_key(np.sum, (arr.copy(), ),
+                                              {'axis': 0}))
+    # a non-contiguous view hashes like its contents
+    assert_equal(result_cache.result_key(np.sum, (arr.T, )),
+                 result_cache.result_key(np.sum,
+                                         (np.ascontiguousarray(arr.T), )))
+    for other in [result_cache.result_key(np.sum, (arr, ), {'axis': 1}),
+                  result_cache.result_key(np.mean, (arr, ), {'axis': 0}),
+                  result_cache.result_key(np.sum, (arr.astype(int), ),
+                                          {'axis': 0}),
+                  result_cache.result_key(np.sum, (arr.reshape(4, 3), ),
+                                          {'axis': 0})]:
+        assert_not_equal(key, other)
+    # arbitrary objects can not be hashed by value
+    assert_equal(result_cache.result_key(np.sum, (object(), )), None)
+    # nor can ndarray subclasses, whose state is not all in the buffer
+    masked = np.ma.masked_array(arr, mask=arr > 5)
+    assert_equal(result_cache.result_key(np.sum, (masked, )), None)
+    # the ufuncs and functions of a module have a stable identity, other
+    # callables do not
+    assert_true(result_cache.result_key(np.add, (arr, arr)) is not None)
+    assert_true(result_cache.result_key(_scale, (arr, )) is not None)
+    for func in [functools.partial(_scale, scale=2), _Scaler(2),
+                 lambda arr: arr * 2, _Scaler(2).__call__]:
+        assert_equal(result_cache.result_key(func, (arr, )), None)
+
+
+def test_cached_call():
+    result_cache.clear_result_cache()
+    del _SCALE_CALLS[:]
+    arr = np.arange(10)
+    res = result_cache.cached_call(_scale, (arr, ), {'scale': 2})
+    assert_array_equal(res, arr * 2)
+    res = result_cache.cached_call(_scale, (arr.copy(), ), {'scale': 2})
+    assert_array_equal(res, arr * 2)
+    assert_equal(len(_SCALE_CALLS), 1)
+    result_cache.cached_call(_scale, (arr, ), {'scale': 3})
+    assert_equal(len(_SCALE_CALLS), 2)
+
+    info = result_cache.result_cache_info()
+    assert_equal(info['hits'], 1)
+    assert_equal(info['misses'], 2)
+    assert_equal(info['size'], 2)
+    assert_equal(info['nbytes'], 2 * res.nbytes)
+
+    # uncacheable arguments and functions go straight to the function
+    obj = object()
+    assert_equal(result_cache.cached_call(id, (obj, )), id(obj))
+    assert_array_equal(result_cache.cached_call(_Scaler(4), (arr, )),
+                       arr * 4)
+    assert_array_equal(result_cache.cached_call(_Scaler(5), (arr, )),
+                       arr * 5)
+    assert_equal(result_cache.result_cache_info()['uncacheable'], 3)
+
+    # wrappers are cached under the function they stand in for
+    calls = len(_SCALE_CALLS)
+    res = result_cache.cached_call(functools.partial(_scale), (arr, ),
+                                   {'scale': 3}, key_func=_scale)
+    assert_array_equal(res, arr * 3)
+    assert_equal(len(_SCALE_CALLS), calls)
+    result_cache.clear_result_cache()
+
+
+def test_result_cache_budget():
+    result_cache.clear_result_cache()
+    budget = result_cache.result_cache_info()['max_bytes']
+    frames = [np.full(100, i, dtype=np.float64) for i in range(3)]
+    try:
+        # room for two results
+        result_cache.set_result_cache_budget(2 * frames[0].nbytes)
+        for frame in frames[:2]:
+            result_cache.cached_call(_scale, (frame, ))
+        # use the first one, so that the second one is evicted
+        result_cache.cached_call(_scale, (frames[0], ))
+        result_cache.cached_call(_scale, (frames[2], ))
+        info = result_cache.result_cache_info()
+        assert_equal(info['evictions'], 1)
+        assert_true(info['nbytes'] <= info['max_bytes'])
+        calls = len(_SCALE_CALLS)
+        result_cache.cached_call(_scale, (frames[0], ))
+        assert_equal(len(_SCALE_CALLS), calls)
+        result_cache.cached_call(_scale, (frames[1], ))
+        assert_equal(len(_SCALE_CALLS), calls + 1)
+    finally:
+        result_cache.set_result_cache_budget(budget)
+        result_cache.clear_result_cache()
@@ -38,6 +38,12 @@ from __future__ import (absolute_import, division, print_function,
 from itertools import product
 import six
 import logging
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import types
 logger = logging.getLogger(__name__)
 
 from vttools import scrape
@@ -45,6 +51,7 @@ from vttools import scrape
 
 from numpy.testing import assert_string_equal, assert_equal, assert_raises
 from nose.tools import assert_true
+from skxray.testing.decorators import skip_if
 
 from vttools.tests.scrape_test_source import (
     eat_porridge, porridge_for_the_bears, has_defaults)
@@ -275,6 +282,55 @@ def test_check_alt_types():
         yield _normalize_test_helper, ts, tar,
 
 
+def _type_string_corpus():
+    """
+    All of the type strings used in the tests plus the (raw and
+    optional-stripped) types in the docstrings of the numpy/scipy
+    modules that are installed.
+    """
+    corpus = set()
+    for strings in (object_type_strings, array_type_strings,
+                    matrix_type_strings, list_type_strings,
+                    tuple_type_strings, seq_type_strings,
+                    dtype_type_strings, bool_type_strings,
+                    file_type_strings, scalar_type_strings,
+                    float_type_strings, int_type_strings,
+                    complex_type_strings, dict_type_strings,
+                    str_type_strings, callable_type_strings):
+        corpus.update(strings)
+    corpus.update(('float or int', 'scalar or tuple of scalars',
+                   'aardvark of doom', 'list or aardavrk', 'of or',
+                   'tuple of int or None', 'array of ints, optional',
+                   'sequence of array_like', ' `int`.', ''))
+
+    for mod_name in ('numpy', 'numpy.fft', 'numpy.linalg', 'numpy.random',
+                     'scipy.signal', 'scipy.ndimage', 'scipy.special',
+                     'scipy.stats'):
+        try:
+            mod = importlib.import_module(mod_name)
+        except ImportError:
+            continue
+        for func_name in scrape.list_functions(mod_name):
+            try:
+                doc = scrape.docstring_func(getattr(mod, func_name))
+            except Exception:
+                continue
+            for section in ('Parameters', 'Returns'):
+                for _, the_type, _ in doc[section]:
+                    corpus.add(the_type)
+                    corpus.add(scrape._type_optional(the_type)[0])
+    return corpus
+
+
+def test_classifier_matches_walk():
+    mismatches = [(ts, scrape._normalize_type(ts),
+                   scrape._normalize_type_walk(ts))
+                  for ts in sorted(_type_string_corpus())
+                  if (scrape._normalize_type(ts) !=
+                      scrape._normalize_type_walk(ts))]
+    assert_equal(mismatches, [])
+
+
 def test_truncate_description():
     original_description1 = ['length of three']
     original_description2 = ['This object is the original description '
@@ -367,3 +423,173 @@ def _mod_scrape_test_helper(mod_name, kwargs_with, kwargs_without,
     res = scrape.scrape_module(mod_name, **kwargs_without)
     for n in test_members:
         assert_true(n not in res)
+
+
+def test_spec_cache():
+    mod_name = 'vttools.tests.scrape_test_source'
+    cache_dir = tempfile.mkdtemp()
+    try:
+        res = scrape.scrape_module(mod_name, cache_dir=cache_dir)
+        cache_file = scrape._spec_cache_file(cache_dir, mod_name)
+        assert_true(os.path.exists(cache_file))
+        # a warm scrape must come back from the cache unchanged
+        assert_equal(scrape.scrape_module(mod_name, cache_dir=cache_dir),
+                     res)
+        # a different black list must not re-use the cached specs
+        res = scrape.scrape_module(mod_name, cache_dir=cache_dir,
+                                   black_list=['has_defaults'])
+        assert_true('has_defaults' not in res)
+        scrape.clear_spec_cache(cache_dir)
+        assert_true(not os.path.exists(cache_file))
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_scrape_modules():
+    mod_names = ['vttools.tests.scrape_test_source', 'vttools.tests.nope']
+    for processes in (1, 2):
+        res = scrape.scrape_modules(mod_names, processes=processes,
+                                    black_list=['has_defaults'])
+        assert_equal(list(res), mod_names)
+        assert_equal(res[mod_names[0]],
+                     scrape.scrape_module(mod_names[0],
+                                          black_list=['has_defaults']))
+        # modules that fail to import come back empty
+        assert_equal(res[mod_names[1]], {})
+
+
+def test_scrape_modules_unpicklable():
+    mod_name = 'vttools.tests.scrape_test_source'
+    expected = scrape.scrape_module(mod_name)
+    scrape_module = scrape.scrape_module
+
+    def unpicklable_scrape(module_path, **kwargs):
+        specs = scrape_module(module_path, **kwargs)
+        specs['eat_porridge'] = dict(specs['eat_porridge'],
+                                     doc_string=lambda: None)
+        return specs
+
+    scrape.scrape_module = unpicklable_scrape
+    try:
+        res = scrape.scrape_modules([mod_name, mod_name], processes=2)
+    finally:
+        scrape.scrape_module = scrape_module
+    # the spec the workers could not send back is scraped in this process
+    assert_equal(res[mod_name], expected)
+
+
+def test_type_cache_info():
+    scrape.clear_type_caches()
+    for _ in range(3):
+        scrape._normalize_type('int or float')
+    info = scrape.type_cache_info()['_normalize_type']
+    # 'int or float', 'int ' and ' float' are each parsed once
+    assert_equal(info['misses'], 3)
+    assert_equal(info['hits'], 2)
+    assert_equal(info['size'], 3)
+
+    # the memoized enum values must not be shared with the caller
+    enum_list = scrape._enum_type("{'a', 'b'}")[2]
+    enum_list.append('c')
+    assert_equal(scrape._enum_type("{'a', 'b'}")[2], ['a', 'b'])
+
+    scrape.clear_type_caches()
+    assert_equal(scrape.type_cache_info()['_normalize_type']['size'], 0)
+
+
+def test_deferred_source():
+    res = scrape.scrape_function('eat_porridge', __name__, defer_source=True)
+    assert_true(isinstance(res['doc_string'], scrape.DeferredSource))
+    assert_equal(res['doc_string'].resolve(),
+                 scrape.scrape_function('eat_porridge',
+                                        __name__)['doc_string'])
+
+
+def test_incremental_scrape():
+    mod_name = 'vttools.tests.scrape_test_source'
+    first = scrape.scrape_module_incremental(mod_name)
+    assert_equal(sorted(first['added']), sorted(first['specs']))
+
+    previous = {'specs': dict(first['specs'], gone={}),
+                'hashes': dict(first['hashes'], eat_porridge='stale')}
+    res = scrape.scrape_module_incremental(mod_name, previous=previous)
+    assert_equal(res['added'], [])
+    assert_equal(res['changed'], ['eat_porridge'])
+    assert_equal(res['removed'], ['gone'])
+    assert_equal(res['specs'], first['specs'])
+    # unchanged functions are not re-scraped
+    assert_true(res['specs']['has_defaults'] is
+                first['specs']['has_defaults'])
+
+
+# keyword-only arguments are a syntax error on python 2
+_KW_ONLY_SOURCE = '''
+def kw_only(a, *, b=1):
+    """
+    A function with a keyword-only argument
+
+    Parameters
+    ----------
+    a : int
+        The first
+    b : int, optional
+        The keyword-only one
+    """
+    return a + b
+
+
+def positional(a):
+    """
+    A plain function next to it
+
+    Parameters
+    ----------
+    a : int
+        The only one
+    """
+    return a
+'''
+
+
+@skip_if(six.PY2, 'keyword-only arguments need python 3')
+def test_incremental_scrape_kw_only():
+    mod_name = 'vttools.tests._kw_only_source'
+    mod = types.ModuleType(mod_name)
+    six.exec_(_KW_ONLY_SOURCE, mod.__dict__)
+    sys.modules[mod_name] = mod
+    try:
+        assert_true(scrape._function_hash(mod.kw_only) !=
+                    scrape._function_hash(mod.positional))
+        res = scrape.scrape_module_incremental(mod_name)
+        # the keyword-only function does not cost the rest of the module
+        assert_true('positional' in res['specs'])
+        assert_equal(sorted(res['hashes']), sorted(res['specs']))
+    finally:
+        del sys.modules[mod_name]
+
+
+def test_scrape_class():
+    mod_name = 'vttools.tests.scrape_test_source'
+    spec = scrape.scrape_class('Porridge', mod_name)
+    ctor_ports = dict((p['name'], p) for p in
+                      spec['constructor']['input_ports'])
+    assert_equal(sorted(ctor_ports), ['size', 'temperature'])
+    assert_true(ctor_ports['size']['optional'])
+    assert_equal(ctor_ports['size']['default'], 1)
+    assert_equal(sorted(spec['methods']), ['cool', 'eat'])
+    cool = spec['methods']['cool']
+    assert_equal([p['name'] for p in cool['input_ports']], ['delta'])
+    assert_equal([p['name'] for p in cool['output_ports']], ['temperature'])
+    assert_equal(spec['methods']['eat']['output_ports'], [])
+
+    spec = scrape.scrape_class('Porridge', mod_name, methods=['eat'])
+    assert_equal(list(spec['methods']), ['eat'])
+
+
+def test_coerce_ports():
+    ports = dict((p['name'], p) for p in
+                 scrape.scrape_function('convolve', 'numpy')['input_ports'])
+    # array_like inputs are converted to arrays by wrap_lib
+    assert_equal(ports['a']['coerce'], 'array')
+    assert_equal(ports['v']['coerce'], 'array')
+    assert_true('coerce' not in ports['mode'])
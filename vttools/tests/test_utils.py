@@ -40,9 +40,11 @@ import six
 import logging
 logger = logging.getLogger(__name__)
 
-from nose.tools import assert_true
+from nose.tools import assert_true, assert_equal
+from numpy.testing import assert_raises
 from skxray.testing.decorators import known_fail_if, skip_if
-from vttools.utils import make_symlink, query_yes_no
+from six.moves import cPickle as pickle
+from vttools.utils import make_symlink, query_yes_no, dump_pickle
 import tempfile
 import os
 import shutil
@@ -86,3 +88,21 @@ def test_make_symlink():
     destroy(dst)
 
     shutil.rmtree(test_loc)
+
+
+def test_dump_pickle():
+    test_loc = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(test_loc, 'sub', 'obj.pkl')
+        dump_pickle({'a': 1}, fname)
+        # the file is replaced, not appended to
+        dump_pickle([1, 2], fname)
+        with open(fname, 'rb') as f:
+            assert_equal(pickle.load(f), [1, 2])
+        # a failed write leaves the old file and no temporary file
+        assert_raises(Exception, dump_pickle, lambda x: x, fname)
+        with open(fname, 'rb') as f:
+            assert_equal(pickle.load(f), [1, 2])
+        assert_equal(os.listdir(os.path.dirname(fname)), ['obj.pkl'])
+    finally:
+        shutil.rmtree(test_loc)
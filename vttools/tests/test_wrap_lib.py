@@ -0,0 +1,459 @@
+# ######################################################################
+# Copyright (c) 2014, Brookhaven Science Associates, Brookhaven        #
+# National Laboratory. All rights reserved.                            #
+#                                                                      #
+# Redistribution and use in source and binary forms, with or without   #
+# modification, are permitted provided that the following conditions   #
+# are met:                                                             #
+#                                                                      #
+# * Redistributions of source code must retain the above copyright     #
+#   notice, this list of conditions and the following disclaimer.      #
+#                                                                      #
+# * Redistributions in binary form must reproduce the above copyright  #
+#   notice this list of conditions and the following disclaimer in     #
+#   the documentation and/or other materials provided with the         #
+#   distribution.                                                      #
+#                                                                      #
+# * Neither the name of the Brookhaven Science Associates, Brookhaven  #
+#   National Laboratory nor the names of its contributors may be used  #
+#   to endorse or promote products derived from this software without  #
+#   specific prior written permission.                                 #
+#                                                                      #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS  #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT    #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS    #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE       #
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,           #
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES   #
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR   #
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)   #
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,  #
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OTHERWISE) ARISING   #
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE   #
+# POSSIBILITY OF SUCH DAMAGE.                                          #
+########################################################################
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import six
+import logging
+import time
+logger = logging.getLogger(__name__)
+
+import numpy as np
+from numpy.testing import assert_array_equal, assert_raises
+from nose.tools import assert_equal, assert_true, raises
+from vistrails.core.modules.vistrails_module import ModuleError
+
+from vttools import wrap_lib, result_cache, profiling
+
+
+def _execute(module_class, **inputs):
+    """Run the compute of `module_class` with `inputs` on its input ports
+
+    Returns
+    -------
+    outputs : dict
+        The values compute set, keyed on output port name
+    """
+    return _compute(module_class(), **inputs)
+
+
+def _compute(module, **inputs):
+    """Run the compute of the `module` instance, see `_execute`
+    """
+    outputs = {}
+    defaults = dict((port.name, port.default)
+                    for port in type(module)._input_ports
+                    if getattr(port, 'default', None) is not None)
+
+    def get_input(port_name, allow_default=True):
+        if port_name in inputs:
+            return inputs[port_name]
+        if allow_default and port_name in defaults:
+            return defaults[port_name]
+        raise ModuleError(module, 'Missing value from port {0}'
+                                  ''.format(port_name))
+
+    module.has_input = lambda port_name: port_name in inputs
+    module.get_input = get_input
+    module.set_output = outputs.__setitem__
+    module.compute()
+    return outputs
+
+
+class _Value(object):
+    # port values of the NSLS2 port types carry a 'value'
+    def __init__(self, value):
+        self.value = value
+
+
+def _kwargs(**kwargs):
+    return kwargs
+
+
+def _kwargs_module(**kwargs):
+    input_ports = [dict(name='a', signature='basic:Integer'),
+                   dict(name='b', signature='basic:Float', optional=True),
+                   dict(name='_window', signature='basic:Integer',
+                        optional=True)]
+    dict_port = kwargs.get('dict_port')
+    if dict_port is not None:
+        input_ports.append(dict_port)
+    return wrap_lib.gen_module(
+        input_ports=input_ports,
+        output_ports=[dict(name='kwargs', signature='basic:Dictionary')],
+        docstring='', module_name='kwargs', library_func=_kwargs,
+        module_namespace='test', **kwargs)
+
+
+def test_gen_module_binding():
+    module_class = _kwargs_module()
+    tests = [({'a': 1}, {'a': 1}),
+             # the values of the NSLS2 port types are unwrapped
+             ({'a': _Value(2), 'b': _Value(0.5)}, {'a': 2, 'b': 0.5}),
+             # reserved names keep the prefix of their port
+             ({'a': 1, 'b': 1.5, '_window': 3},
+              {'a': 1, 'b': 1.5, '_window': 3})]
+    for inputs, expected in tests:
+        assert_equal(_execute(module_class, **inputs),
+                     {'kwargs': expected})
+
+
+def test_gen_module_dict_port():
+    module_class = _kwargs_module(
+        dict_port=dict(name='input_dict', signature='basic:Dictionary'))
+    tests = [({'input_dict': {'a': 5, 'b': _Value(2.5)}},
+              {'a': 5, 'b': 2.5}),
+             # the ports take precedence over the dictionary
+             ({'a': 1, 'input_dict': {'a': 5}}, {'a': 1})]
+    for inputs, expected in tests:
+        assert_equal(_execute(module_class, **inputs),
+                     {'kwargs': expected})
+
+
+@raises(ModuleError)
+def test_gen_module_mandatory():
+    _execute(_kwargs_module(), b=1.5)
+
+
+def _check_coerce(val, expected, outcome, same):
+    module_class = wrap_lib.gen_module(
+        input_ports=[dict(name='arr', signature='basic:Variant',
+                          coerce='array')],
+        output_ports=[dict(name='kwargs', signature='basic:Dictionary')],
+        docstring='', module_name='coerced', library_func=_kwargs,
+        module_namespace='test')
+    # the IPort does not get the 'coerce' entry
+    assert_equal([port.name for port in module_class._input_ports], ['arr'])
+    profiling.reset_coercion_report()
+    res = _execute(module_class, arr=val)['kwargs']['arr']
+    assert_equal(type(res), type(expected))
+    if isinstance(expected, np.ndarray):
+        assert_array_equal(res, expected)
+        assert_true(res.flags.c_contiguous or outcome != 'converted')
+    else:
+        assert_equal(res, expected)
+    assert_equal(res is val, same)
+    assert_equal(profiling.coercion_report()['test|coerced.arr'][outcome], 1)
+    profiling.reset_coercion_report()
+
+
+def test_coerce_array():
+    arr = np.arange(6.).reshape(2, 3)
+    masked = np.ma.masked_array(arr.T, mask=arr.T > 2)
+    tests = [(arr, arr, 'passthrough', True),
+             (arr.T, arr.T.copy(), 'converted', False),
+             ([[1, 2], [3, 4]], np.array([[1, 2], [3, 4]]), 'converted',
+              False),
+             # subclasses would lose their state (the mask)
+             (masked, masked, 'skipped', True),
+             (1.5, 1.5, 'skipped', True),
+             ([[1, 2], [3]], [[1, 2], [3]], 'failed', True)]
+    for val, expected, outcome, same in tests:
+        yield _check_coerce, val, expected, outcome, same
+
+
+def _double(arr, offset=0):
+    return np.asarray(arr) * 2 + offset
+
+
+def _min_max(arr):
+    return np.min(arr), np.max(arr)
+
+
+def _map_module(library_func, output_names):
+    return wrap_lib.gen_module(
+        input_ports=[dict(name='arr', signature='basic:Variant'),
+                     dict(name='offset', signature='basic:Integer',
+                          optional=True)],
+        output_ports=[dict(name=name, signature='basic:Variant')
+                      for name in output_names],
+        docstring='', module_name=library_func.__name__,
+        library_func=library_func, module_namespace='test',
+        map_ports=['arr'], map_workers=2)
+
+
+def test_map_mode():
+    module_class = _map_module(_double, ['doubled'])
+    assert_equal([port.name for port in module_class._output_ports],
+                 ['doubled', 'doubled_list'])
+    arrays = [np.arange(4), np.arange(3), np.ones((2, 2))]
+    # a plain call sets the plain output port only
+    outputs = _execute(module_class, arr=arrays[0], offset=1)
+    assert_equal(list(outputs), ['doubled'])
+    assert_array_equal(outputs['doubled'], arrays[0] * 2 + 1)
+
+    outputs = _execute(module_class, arr_list=arrays, offset=1)
+    assert_equal(list(outputs), ['doubled_list'])
+    assert_equal(len(outputs['doubled_list']), len(arrays))
+    for res, arr in zip(outputs['doubled_list'], arrays):
+        assert_array_equal(res, arr * 2 + 1)
+
+
+def test_map_mode_outputs():
+    module_class = _map_module(_min_max, ['low', 'high'])
+    outputs = _execute(module_class, arr=np.arange(5))
+    assert_equal(outputs, {'low': 0, 'high': 4})
+    outputs = _execute(module_class, arr_list=[np.arange(5), [7, 3]])
+    assert_equal(outputs, {'low_list': [0, 3], 'high_list': [4, 7]})
+
+
+@raises(ModuleError)
+def test_map_mode_missing():
+    # either the port or its list variant is needed
+    _execute(_map_module(_double, ['doubled']), offset=1)
+
+
+def _add_module(**kwargs):
+    return wrap_lib.gen_module_ufunc(
+        input_ports=[dict(name='x1', signature='basic:Variant'),
+                     dict(name='x2', signature='basic:Variant')],
+        output_ports=[dict(name='y', signature='basic:Variant')],
+        docstring='', module_name='add', library_func=np.add,
+        module_namespace='test', **kwargs)
+
+
+def test_ufunc_reuse_output():
+    module_class = _add_module(reuse_output=True)
+    first, second = module_class(), module_class()
+    arr = np.arange(6.).reshape(2, 3)
+    res_first = _compute(first, x1=arr, x2=arr)['y']
+    res_second = _compute(second, x1=arr, x2=arr)['y']
+    assert_true(res_first is not res_second)
+
+    # the next result of a module goes into its previous output...
+    res = _compute(first, x1=arr, x2=arr + 1)['y']
+    assert_true(res is res_first)
+    assert_array_equal(res, 2 * arr + 1)
+    # ...and does not touch the output of the other module
+    assert_array_equal(res_second, 2 * arr)
+    # unless the shape or the types changed
+    res = _compute(first, x1=arr[0], x2=arr[0])['y']
+    assert_true(res is not res_first)
+    assert_array_equal(res, 2 * arr[0])
+    res = _compute(first, x1=arr.astype(int), x2=arr.astype(int))['y']
+    assert_equal(res.dtype, arr.astype(int).dtype)
+
+
+def test_ufunc_reuse_scalar_types():
+    module = _add_module(reuse_output=True)()
+    arr = np.arange(1, 4, dtype=np.int8)
+    for value in (200, np.int16(200)):
+        try:
+            expected = np.add(arr, value)
+        except OverflowError:
+            # numpy 2 does not promote python ints on their value
+            continue
+        res = _compute(module, x1=arr, x2=100)['y']
+        assert_equal(res.dtype, np.int8)
+        # 200 does not fit the int8 buffer of the previous call
+        res = _compute(module, x1=arr, x2=value)['y']
+        assert_equal(res.dtype, expected.dtype)
+        assert_array_equal(res, expected)
+
+
+def test_ufunc_reuse_pipeline():
+    module_class = _add_module(reuse_output=True)
+    arr = np.arange(4.)
+
+    def run(module_id, x2):
+        # VisTrails creates a new instance on each execution
+        module = module_class()
+        module.moduleInfo = {'vistrailName': 'test', 'moduleId': module_id}
+        return _compute(module, x1=arr, x2=x2)['y']
+
+    first = run(3, arr)
+    res = run(3, arr + 1)
+    assert_true(res is first)
+    assert_array_equal(res, 2 * arr + 1)
+    assert_true(run(4, arr) is not first)
+    assert_array_equal(first, 2 * arr + 1)
+
+
+def test_ufunc_out_port():
+    assert_equal([port.name for port in _add_module()._input_ports],
+                 ['x1', 'x2'])
+    module_class = _add_module(reuse_output=True)
+    assert_equal([port.name for port in module_class._input_ports],
+                 ['x1', 'x2', 'out'])
+    arr = np.arange(4.)
+    out = np.empty(4)
+    res = _execute(module_class, x1=arr, x2=arr, out=out)['y']
+    assert_true(res is out)
+    assert_array_equal(out, 2 * arr)
+
+
+def _check_chunked(ufunc, shape, dtype):
+    chunked = wrap_lib._chunked_ufunc(ufunc, workers=4)
+    args = [(np.arange(np.prod(shape)) % 251).astype(dtype).reshape(shape)
+            for _ in range(ufunc.nin)]
+    if ufunc.nin > 1:
+        # the second argument broadcasts along the leading axis
+        args[-1] = args[-1][:1] + 1
+    expected = ufunc(*args)
+    res = chunked(*args)
+    if ufunc.nout == 1:
+        expected, res = (expected, ), (res, )
+    for arr, exp in zip(res, expected):
+        assert_equal(arr.dtype, exp.dtype)
+        assert_array_equal(arr, exp)
+
+    out = tuple(np.empty_like(exp) for exp in expected)
+    res = chunked(*args, out=out if ufunc.nout > 1 else out[0])
+    for arr, exp in zip(out, expected):
+        assert_array_equal(arr, exp)
+
+
+def test_chunked_ufunc():
+    for ufunc, shape, dtype in [
+            # smaller than _CHUNK_MIN_SIZE
+            (np.add, (10, 10), np.float64),
+            # one block holds all of the rows
+            (np.add, (1024, 1024), np.uint16),
+            (np.add, (2 ** 21, ), np.uint8),
+            # several blocks
+            (np.add, (2048, 1024), np.uint16),
+            (np.multiply, (512, 64, 64), np.float64),
+            (np.modf, (1024, 2048), np.float32)]:
+        yield _check_chunked, ufunc, shape, dtype
+
+
+def test_ufunc_chunk_workers():
+    module_class = _add_module(chunk_workers=2)
+    arr = np.ones((1024, 1024), dtype=np.uint16)
+    assert_array_equal(_execute(module_class, x1=arr, x2=arr)['y'], 2 * arr)
+
+
+def _slow_double(arr, delay=0.):
+    time.sleep(delay)
+    return np.asarray(arr) * 2
+
+
+def _async_module(async_mode, **kwargs):
+    return wrap_lib.gen_module(
+        input_ports=[dict(name='arr', signature='basic:Variant'),
+                     dict(name='delay', signature='basic:Float',
+                          optional=True)],
+        output_ports=[dict(name='doubled', signature='basic:Variant')],
+        docstring='', module_name='slow_double', library_func=_slow_double,
+        module_namespace='test', async_mode=async_mode, **kwargs)
+
+
+class _Aborted(Exception):
+    pass
+
+
+class _ProgressLog(object):
+    # stands in for the logging of the VisTrails interpreter
+    def __init__(self, abort=False):
+        self.progress = []
+        self.abort = abort
+
+    def update_progress(self, module, progress):
+        if self.abort:
+            raise _Aborted()
+        self.progress.append(progress)
+
+
+def _check_async(async_mode):
+    module = _async_module(async_mode)()
+    module.logging = _ProgressLog()
+    outputs = _compute(module, arr=np.arange(3), delay=0.35)
+    assert_array_equal(outputs['doubled'], np.arange(3) * 2)
+    progress = module.logging.progress
+    assert_true(len(progress) > 0)
+    assert_equal(progress, sorted(progress))
+    assert_true(0 < progress[-1] < 1)
+
+
+def _check_async_abort(async_mode):
+    module = _async_module(async_mode)()
+    module.logging = _ProgressLog(abort=True)
+    t0 = time.time()
+    assert_raises(_Aborted, _compute, module, arr=np.arange(3), delay=2.)
+    if async_mode == 'process':
+        # the worker process is terminated, not waited for
+        assert_true(time.time() - t0 < 1.5)
+
+
+def _check_async_pool(async_mode):
+    module_class = _async_module(async_mode)
+    _compute(module_class(), arr=np.arange(3))
+    pool = wrap_lib._ASYNC_POOLS[async_mode]
+    # the worker is kept for the next executions, of any module
+    _compute(module_class(), arr=np.arange(3))
+    _compute(_async_module(async_mode)(), arr=np.arange(3))
+    assert_true(wrap_lib._ASYNC_POOLS[async_mode] is pool)
+    # and replaced once a call was aborted
+    module = module_class()
+    module.logging = _ProgressLog(abort=True)
+    assert_raises(_Aborted, _compute, module, arr=np.arange(3), delay=2.)
+    assert_true(wrap_lib._ASYNC_POOLS.get(async_mode) is not pool)
+    assert_array_equal(_compute(module_class(), arr=np.arange(3))['doubled'],
+                       np.arange(3) * 2)
+
+
+def test_async_mode():
+    for async_mode in ('thread', 'process'):
+        yield _check_async, async_mode
+        yield _check_async_abort, async_mode
+        yield _check_async_pool, async_mode
+
+
+def test_async_mode_options():
+    assert_raises(ValueError, _async_module, 'fork')
+    # the result cache lives in this process
+    assert_raises(ValueError, _async_module, 'process', cache_results=True)
+    _async_module('thread', cache_results=True)
+
+
+def test_wrap_class():
+    result_cache.clear_result_cache()
+    ctor, cool, eat = wrap_lib.wrap_class(
+        'Porridge', 'vttools.tests.scrape_test_source', namespace='test',
+        cache_instances=True)
+    assert_equal([ctor.__name__, cool.__name__, eat.__name__],
+                 ['Porridge', 'cool', 'eat'])
+    assert_equal(cool._settings.namespace, 'test|Porridge')
+    porridge = _execute(ctor, temperature=100.)['instance']
+    assert_equal((porridge.temperature, porridge.size), (100., 1))
+    # the instance is re-used while the arguments do not change
+    assert_true(_execute(ctor, temperature=100.)['instance'] is porridge)
+    assert_true(_execute(ctor, temperature=90.)['instance'] is not porridge)
+
+    assert_equal(_execute(cool, instance=porridge, delta=10.),
+                 {'temperature': 90., 'instance': porridge})
+    assert_equal(_execute(eat, instance=porridge), {'instance': porridge})
+    assert_equal(porridge.size, 0)
+    result_cache.clear_result_cache()
+
+
+def test_wrap_class_no_cache():
+    # the instances are not cached by default
+    ctor = wrap_lib.wrap_class('Porridge', 'vttools.tests.scrape_test_source',
+                               methods=[])[0]
+    assert_true(_execute(ctor, temperature=100.)['instance'] is not
+                _execute(ctor, temperature=100.)['instance'])
+
+
@@ -36,9 +36,11 @@
 from __future__ import (absolute_import, division,
                         print_function, )
 import six
+from six.moves import cPickle as pickle
 import os
 import shutil
 import sys
+import tempfile
 from sys import platform as _platform
 from subprocess import call
 
@@ -133,3 +135,41 @@ def make_symlink(dst, src, silently_move=False):
         call(['mklink', '/j', dst, src], shell=True)
 
     return True
+
+
+def dump_pickle(obj, fname):
+    """Pickle `obj` into `fname`, replacing the file atomically
+
+    The pickle goes to a temporary file next to `fname` which is then
+    moved into place, so that concurrent readers never see a partial
+    file.
+
+    Parameters
+    ----------
+    obj : object
+        What to pickle
+    fname : str
+        File to write, its directory is created if needed
+
+    Raises
+    ------
+    Exception
+        Whatever pickling or writing raised, the temporary file is then
+        removed
+    """
+    dir_name = os.path.dirname(os.path.abspath(fname))
+    if not os.path.isdir(dir_name):
+        os.makedirs(dir_name)
+    fd, tmp_file = tempfile.mkstemp(dir=dir_name,
+                                    suffix=os.path.basename(fname) + '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, protocol=2)
+        if os.path.exists(fname):
+            # os.rename will not overwrite on windows
+            os.remove(fname)
+        os.rename(tmp_file, fname)
+    except Exception:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
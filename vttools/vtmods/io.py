@@ -40,9 +40,12 @@ from vistrails.core.modules.vistrails_module import (Module, ModuleSettings,
 from vistrails.core.modules.config import IPort, OPort
 from tifffile import imread
 from skxray.io.binary import read_binary
+from vttools.image_io import read_tiff_stack, load_numpy
+from vttools.frame_stack import LazyFrameStack
+from vttools.file_index import get_file_index
 import numpy as np
-import os
 import glob
+import time
 
 import logging
 logger = logging.getLogger(__name__)
@@ -52,7 +55,12 @@ class ReadNumpy(Module):
     _settings = ModuleSettings(namespace="io")
     _input_ports = [
         IPort(name="file", label="File to read in",
-              signature="basic:List")
+              signature="basic:List"),
+        IPort(name="mmap_mode", label="Memory map the .npy files: "
+                                      "r, r+ or c (see numpy.load)",
+              signature="basic:String", optional=True),
+        IPort(name="lazy", label="Memory map the .npy files read-only",
+              signature="basic:Boolean", default=False),
     ]
     _output_ports = [
         OPort(name="data", signature="basic:List")
@@ -60,8 +68,18 @@ class ReadNumpy(Module):
 
     def compute(self):
         fnames = self.get_input('file')
+        mmap_mode = None
+        if self.has_input('mmap_mode'):
+            mmap_mode = self.get_input('mmap_mode') or None
+        elif self.get_input('lazy'):
+            mmap_mode = 'r'
+        if mmap_mode not in (None, 'r', 'r+', 'c'):
+            raise ModuleError(self, 'mmap_mode must be r, r+ or c, not '
+                                    '{0!r}'.format(mmap_mode))
         data = []
-        data = [np.load(fname + '.npy') for fname in fnames]
+        for fname in fnames:
+            # .npz archives add all of their arrays
+            data.extend(load_numpy(fname, mmap_mode=mmap_mode))
         self.set_output('data', data)
 
 
@@ -71,18 +89,99 @@ class ReadTiff(Module):
     _input_ports = [
         IPort(name="files", label="List of files",
               signature="basic:List"),
+        IPort(name="workers", label="Number of files read concurrently",
+              signature="basic:Integer", default=1),
+        IPort(name="memmap", label="Read the frames when they are used: "
+                                   "memory map the uncompressed files, "
+                                   "decode the compressed ones on access. "
+                                   "The frames must all have the same "
+                                   "shape",
+              signature="basic:Boolean", default=False),
     ]
 
     _output_ports = [
-        OPort(name="data", signature="basic:List")
+        OPort(name="data", signature="basic:List"),
+        OPort(name="stack", signature="basic:Variant"),
+        OPort(name="throughput", signature="basic:Dictionary"),
     ]
 
     def compute(self):
         files_list = self.get_input("files")
-        data_list = []
-        for file in files_list:
-            data_list.append(imread(file))
-        self.set_output("data", data_list)
+        if self.get_input("memmap"):
+            t0 = time.time()
+            try:
+                stack = LazyFrameStack(files_list, memmap=True)
+            except ValueError as ve:
+                raise ModuleError(self, str(ve))
+            # only the pixels used downstream are read, so nothing has
+            # been read yet
+            self.set_output("data", stack)
+            self.set_output("stack", stack)
+            self.set_output("throughput", {'files': [], 'bytes': 0,
+                                           'seconds': time.time() - t0,
+                                           'throughput': 0.})
+            return
+        workers = self.get_input("workers")
+        try:
+            stack, stats = read_tiff_stack(files_list, workers=workers)
+        except ValueError as ve:
+            # frames of different shapes can not be stacked
+            logger.info('%s, reading the files one by one', ve)
+            t0 = time.time()
+            data_list = []
+            file_stats = []
+            for file in files_list:
+                t1 = time.time()
+                data_list.append(imread(file))
+                file_stats.append((file, data_list[-1].nbytes,
+                                   time.time() - t1))
+            elapsed = time.time() - t0
+            total = sum(nbytes for _, nbytes, _ in file_stats)
+            self.set_output("data", data_list)
+            self.set_output("stack", None)
+            self.set_output("throughput",
+                            {'files': file_stats,
+                             'bytes': total,
+                             'seconds': elapsed,
+                             'throughput': (total / elapsed if elapsed
+                                            else float('inf'))})
+            return
+        # the frames are views into the stack
+        self.set_output("data", list(stack))
+        self.set_output("stack", stack)
+        self.set_output("throughput", stats)
+
+
+class ReadFrameStack(Module):
+    _settings = ModuleSettings(namespace="io")
+
+    _input_ports = [
+        IPort(name="files", label="List of .tif/.tiff/.npy files, one frame "
+                                  "per file",
+              signature="basic:List"),
+        IPort(name="cache_mb", label="Memory budget of the decoded frame "
+                                     "cache, in MB",
+              signature="basic:Float", default=256),
+        IPort(name="memmap", label="Memory map the uncompressed frames "
+                                   "instead of decoding them",
+              signature="basic:Boolean", default=True),
+    ]
+
+    _output_ports = [
+        OPort(name="stack", signature="basic:Variant"),
+    ]
+
+    def compute(self):
+        files_list = self.get_input("files")
+        cache_bytes = int(self.get_input("cache_mb") * 2 ** 20)
+        try:
+            stack = LazyFrameStack(files_list, cache_bytes=cache_bytes,
+                                   memmap=self.get_input("memmap"))
+        except ValueError as ve:
+            raise ModuleError(self, str(ve))
+        # frames are only read when a downstream module indexes the stack
+        self.set_output("stack", stack)
+
 
 class FindData(Module):
     _settings = ModuleSettings(namespace="io")
@@ -103,14 +202,17 @@ class FindData(Module):
     def compute(self):
         seed_path = self.get_input("seed path")
         file_name = self.get_input("file name")
-        print file_name
-        existing_files = []
-
-        for dir_tree in os.walk(os.path.expanduser(seed_path)):
-            if file_name in dir_tree[2]:
-                existing_files.append(os.path.join(dir_tree[0], file_name))
-        print existing_files
-
+        logger.debug('looking for %s under %s', file_name, seed_path)
+        index = get_file_index(seed_path)
+        # refreshed on a miss, a stale hit or once the last refresh is
+        # too old, not on every lookup
+        existing_files = index.lookup(file_name)
+        logger.debug('found %s', existing_files)
+        if not existing_files:
+            raise ModuleError(self, '{0} not found under {1}'
+                                    ''.format(file_name, seed_path))
+
+        file_path = existing_files[0]
         for path in existing_files:
             if 'Demos' in path:
                 file_path = path
@@ -118,6 +220,5 @@ class FindData(Module):
         self.set_output("file path", file_path)
 
 
-
 def vistrails_modules():
-    return [ReadTiff, ReadNumpy, FindData]
+    return [ReadTiff, ReadNumpy, ReadFrameStack, FindData]
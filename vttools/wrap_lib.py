@@ -36,14 +36,27 @@
 from __future__ import (absolute_import, division,
                         print_function)
 import six
+import atexit
+import functools
 import importlib
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import threading
 import time
 import logging
-from .scrape import vt_reserved
+import numpy as np
+from .scrape import scrape_class, DeferredSource
+from .profiling import record_startup, profile_compute, record_coercion
+from .result_cache import cached_call
+from .fusion import FusedUfunc
 from vistrails.core.modules.vistrails_module import (Module, ModuleSettings,
                                                      ModuleError)
 
 from vistrails.core.modules.config import IPort, OPort
+try:
+    from PyQt4 import QtCore
+except ImportError:
+    QtCore = None
 
 logger = logging.getLogger(__name__)
 
@@ -53,7 +66,8 @@ logger = logging.getLogger(__name__)
 
 def gen_module(input_ports, output_ports, docstring,
                module_name, library_func, module_namespace,
-               dict_port=None):
+               dict_port=None, cache_results=False, map_ports=None,
+               map_workers=None, async_mode=None):
     """
     Parameters
     ----------
@@ -74,95 +88,485 @@ def gen_module(input_ports, output_ports, docstring,
         Vistrails namespace to use
 
     dict_port : ?
+
+    cache_results : bool, optional
+        Look the results of `library_func` up in (and store them into)
+        the `result_cache`
+
+    map_ports : list, optional
+        Names of input ports that get a '<name>_list' variant.  When lists
+        are passed, `library_func` is applied to each of their items (along
+        with the other inputs) and the results are set, in order, on
+        '<name>_list' variants of the output ports
+
+    map_workers : int, optional
+        Number of threads applying `library_func` in map mode.  Defaults
+        to the number of CPUs
+
+    async_mode : {None, 'thread', 'process'}, optional
+        Run `library_func` on a worker thread or process while compute
+        waits cooperatively, see `_wait_async`.  Only calls running in a
+        worker process can be cancelled (the process is terminated), the
+        arguments and results must then be picklable.
     """
+    if async_mode not in _ASYNC_MODES:
+        raise ValueError('async_mode must be one of {0}'
+                         ''.format(_ASYNC_MODES))
+    if async_mode == 'process' and cache_results:
+        # the cache lives in this process
+        raise ValueError("cache_results is not supported with a worker "
+                         "process")
+    # the outputs of a plain call, `_map_spec` adds the list variants
+    base_outputs = [pdict['name'] for pdict in output_ports]
+    input_ports, output_ports, map_plan, map_outputs = _map_spec(
+        input_ports, output_ports, map_ports)
+    coercions = dict((pdict['name'], pdict.get('coerce'))
+                     for pdict in input_ports)
     # convert input/output specs into VT port objects
-    input_ports = [IPort(**pdict) for pdict in input_ports]
+    input_ports = [IPort(**_vt_port_args(pdict)) for pdict in input_ports]
     output_ports = [OPort(**pdict) for pdict in output_ports]
-    mandatory = []
-    optional = []
-
-    # create the lists of mandatory and optional input ports
-    for port in input_ports:
-        if port == dict_port:
-            # since dict port must be in the input_ports list but we dont want
-            # to treat it as a normal input port, do not assign it as
-            # optional or mandatory
-            continue
-        if port.optional:
-            optional.append(port.name)
-        else:
-            mandatory.append(port.name)
+    if isinstance(dict_port, dict):
+        dict_port = IPort(**dict_port)
+    call = _library_call(library_func, cache_results)
+    # duration of the last asynchronous call, to estimate the progress
+    durations = {}
+    # work out once how each port binds to the library function so that
+    # compute only does the lookups
+    plan = _binding_plan(input_ports, dict_port, coercions,
+                         _VT_SEP.join([module_namespace, module_name]))
+    # the list variants are bound separately, see `_map_spec`
+    list_names = set(list_name for list_name, _, _ in map_plan)
+    plan = tuple(binding for binding in plan if binding[0] not in list_names)
+    if dict_port is not None:
+        dict_port_name = dict_port.name
+    else:
+        dict_port_name = None
 
     def compute(self):
         dict_from_port = {}
         params_dict = {}
-        if dict_port is not None:
-            dict_from_port = self.get_input(dict_port.name)
+        if dict_port_name is not None:
+            dict_from_port = self.get_input(dict_port_name)
 
-        for opt in optional:
-            if opt in dict_from_port:
+        for port_name, mandatory, coerce in plan:
+            if port_name in dict_from_port:
                 # obtain the parameter from the passed in dict
-                params_dict[opt] = dict_from_port[opt]
-            if self.has_input(opt):
-                if opt in vt_reserved:
-                    p_name = '_' + opt
-                else:
-                    p_name = opt
-                params_dict[opt] = self.get_input(p_name)
-
-        for mand in mandatory:
-            if mand in vt_reserved:
-                p_name = '_' + mand
-            else:
-                p_name = mand
-            if mand in dict_from_port:
-                params_dict[mand] = dict_from_port[mand]
-            try:
-                params_dict[mand] = self.get_input(p_name)
-            except ModuleError as me:
-                if mand in params_dict:
-                    # pass on this exception, as the dictionary on dict_port
-                    # has taken care of this key
-                    pass
-                else:
+                val = dict_from_port[port_name]
+                if hasattr(val, 'value'):
+                    val = val.value
+                params_dict[port_name] = val
+            if mandatory:
+                try:
+                    val = self.get_input(port_name)
+                except ModuleError as me:
+                    if port_name in params_dict:
+                        # pass on this exception, as the dictionary on
+                        # dict_port has taken care of this key
+                        continue
                     logger.debug('The mandatory port {0} does not have input'
                                  'and the input dictionary is either not '
                                  'present or doesn\'t contain this key'
-                                 ''.format(mand))
+                                 ''.format(port_name))
                     raise ModuleError(__name__, me)
-        # check for the presence of a 'value' attribute on the incoming
-        # port values. This indicates that this is a NSLS2 port type
-        for name, val in six.iteritems(params_dict):
+            elif self.has_input(port_name):
+                val = self.get_input(port_name)
+            else:
+                continue
+            # a 'value' attribute on the incoming port value indicates that
+            # this is a NSLS2 port type
             if hasattr(val, 'value'):
-                params_dict[name] = val.value
-        ret = library_func(**params_dict)
-        if len(output_ports) == 1:
-            self.set_output(output_ports[0].name, ret)
+                val = val.value
+            if coerce is not None:
+                val = coerce(val)
+            params_dict[port_name] = val
+
+        mapped = []
+        for list_name, kwarg, mandatory in map_plan:
+            if self.has_input(list_name):
+                mapped.append((kwarg, self.get_input(list_name)))
+            elif mandatory and kwarg not in params_dict:
+                raise ModuleError(self, 'One of the ports {0} or {1} needs '
+                                        'input'.format(list_name[:-5],
+                                                       list_name))
+        if mapped:
+            results = _map_call(call, params_dict, mapped, map_workers)
+            if len(map_outputs) == 1:
+                self.set_output(map_outputs[0], results)
+            else:
+                for idx, out_name in enumerate(map_outputs):
+                    self.set_output(out_name, [ret[idx] for ret in results])
+            return
+
+        if async_mode is None:
+            ret = call(**params_dict)
+        else:
+            ret = _wait_async(self, call, params_dict, async_mode,
+                              durations)
+        if len(base_outputs) == 1:
+            self.set_output(base_outputs[0], ret)
         elif ret: # only when output_ports is not empty
-            for (out_port, ret_val) in zip(output_ports, ret):
-                self.set_output(out_port.name, ret_val)
+            for (out_name, ret_val) in zip(base_outputs, ret):
+                self.set_output(out_name, ret_val)
 
     _settings = ModuleSettings(namespace=module_namespace)
+    # no-op unless the execution profiling is enabled
+    compute = profile_compute(_VT_SEP.join([module_namespace, module_name]),
+                              compute)
 
-    new_class = type(str(module_name),
-                     (Module,), {'compute': compute,
-                                 '__module__': __name__,
-                                 '_settings': _settings,
-                                 '__doc__': docstring,
-                                 '__name__': module_name,
-                                 '_input_ports': input_ports,
-                                 '_output_ports': output_ports})
+    class_dict = {'compute': compute,
+                  '__module__': __name__,
+                  '_settings': _settings,
+                  '__name__': module_name,
+                  '_input_ports': input_ports,
+                  '_output_ports': output_ports}
+    class_dict.update(_doc_attrs(docstring))
+    new_class = type(str(module_name), (Module,), class_dict)
     return new_class
 
 
+def _map_spec(input_ports, output_ports, map_ports):
+    """Add the list variants of the ports of a module in map mode
+
+    Parameters
+    ----------
+    input_ports, output_ports : list
+        Port dictionaries of the module
+    map_ports : list or None
+        Names of the input ports to map over
+
+    Returns
+    -------
+    input_ports, output_ports : list
+        Port dictionaries with the list variants appended.  The mapped
+        input ports become optional, either them or their list variant
+        must be set.
+    map_plan : list
+        (list_port_name, kwarg, mandatory) of each mapped port
+    map_outputs : list
+        Names of the list variants of the output ports
+    """
+    if not map_ports:
+        return input_ports, output_ports, [], []
+    by_name = dict((pdict['name'], pdict) for pdict in input_ports)
+    missing = set(map_ports) - set(by_name)
+    if missing:
+        raise ValueError('Can not map over {0}, there is no such input port'
+                         ''.format(sorted(missing)))
+
+    map_plan = []
+    list_ports = []
+    for name in map_ports:
+        pdict = by_name[name]
+        map_plan.append((name + '_list', name,
+                         not pdict.get('optional', False)))
+        by_name[name] = dict(pdict, optional=True)
+        list_ports.append(dict(name=name + '_list', signature='basic:List',
+                               optional=True,
+                               label='List of {0}, the function is applied '
+                                     'to each item'.format(name)))
+    input_ports = [by_name[pdict['name']] for pdict in input_ports]
+
+    map_outputs = [pdict['name'] + '_list' for pdict in output_ports]
+    output_ports = list(output_ports) + [
+        dict(name=name, signature='basic:List') for name in map_outputs]
+    return input_ports + list_ports, output_ports, map_plan, map_outputs
+
+
+def _map_call(call, params_dict, mapped, workers=None):
+    """Apply `call` over the items of the mapped input lists
+
+    Parameters
+    ----------
+    call : callable
+        The library function
+    params_dict : dict
+        Keyword arguments shared by all the calls
+    mapped : list
+        (kwarg, list of values) of each mapped argument, the lists must
+        all have the same length
+    workers : int, optional
+        Number of threads, defaults to the number of CPUs
+
+    Returns
+    -------
+    results : list
+        The result of each call, in the order of the input lists
+    """
+    lengths = set(len(values) for _, values in mapped)
+    if len(lengths) > 1:
+        raise ValueError('The mapped lists have different lengths: {0}'
+                         ''.format(sorted(lengths)))
+    calls = []
+    for items in zip(*[values for _, values in mapped]):
+        kwargs = dict(params_dict)
+        for (kwarg, _), val in zip(mapped, items):
+            if hasattr(val, 'value'):
+                val = val.value
+            kwargs[kwarg] = val
+        calls.append(kwargs)
+
+    def apply(kwargs):
+        return call(**kwargs)
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(calls))
+    if workers <= 1:
+        return [apply(kwargs) for kwargs in calls]
+    # numpy and scipy release the GIL, so threads are enough
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(apply, calls)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _wait_async(module, call, params_dict, async_mode, durations):
+    """Run ``call(**params_dict)`` on a worker and wait for the result
+
+    While waiting, the progress of `module` is reported to VisTrails
+    (estimated from the duration of the previous call, which is kept in
+    `durations`) and the pending Qt events are processed so that the GUI
+    stays responsive.
+
+    The worker comes from a pool per `async_mode` (see `_async_pool`)
+    that is created on first use and shared by the executions of all of
+    the modules, so a worker process is only started once.  If the wait
+    is interrupted, for example because the user stopped the execution,
+    the pool is dropped: a worker process is terminated, a worker thread
+    finishes in the background.
+
+    Parameters
+    ----------
+    module : Module
+        The executing module
+    call : callable
+        The library function
+    params_dict : dict
+        Its keyword arguments
+    async_mode : {'thread', 'process'}
+        Kind of worker
+    durations : dict
+        Shared by the executions of a module class
+
+    Returns
+    -------
+    ret : object
+        What `call` returned
+    """
+    pool = _async_pool(async_mode)
+    t0 = time.time()
+    try:
+        result = pool.apply_async(call, (), params_dict)
+        while not result.ready():
+            result.wait(_ASYNC_POLL_INTERVAL)
+            elapsed = time.time() - t0
+            expected = durations.get('last')
+            if expected:
+                progress = min(0.99, elapsed / expected)
+            else:
+                # unknown duration, creep towards the end
+                progress = elapsed / (elapsed + 10.)
+            module_logging = getattr(module, 'logging', None)
+            if module_logging is not None:
+                # raises if the execution was aborted
+                module_logging.update_progress(module, progress)
+            if QtCore is not None and QtCore.QCoreApplication.instance():
+                QtCore.QCoreApplication.processEvents()
+        ret = result.get()
+    except BaseException:
+        # also on KeyboardInterrupt
+        _drop_async_pool(async_mode, pool)
+        raise
+    durations['last'] = time.time() - t0
+    return ret
+
+
+def _async_pool(async_mode):
+    """The shared single worker pool of `async_mode`, created on first use
+    """
+    with _ASYNC_POOLS_LOCK:
+        pool = _ASYNC_POOLS.get(async_mode)
+        if pool is None:
+            if async_mode == 'process':
+                pool = multiprocessing.Pool(1)
+            else:
+                pool = ThreadPool(1)
+            _ASYNC_POOLS[async_mode] = pool
+        return pool
+
+
+def _drop_async_pool(async_mode, pool):
+    """Stop using `pool`, the next call of `async_mode` gets a new one
+
+    A worker process is terminated.  A thread can not be stopped, it
+    finishes its call in the background and its result is dropped.
+    """
+    with _ASYNC_POOLS_LOCK:
+        if _ASYNC_POOLS.get(async_mode) is pool:
+            del _ASYNC_POOLS[async_mode]
+    if async_mode == 'process':
+        pool.terminate()
+        pool.join()
+    else:
+        pool.close()
+
+
+def _shutdown_async_pools():
+    """Stop the workers of the asynchronous calls, run at exit
+    """
+    with _ASYNC_POOLS_LOCK:
+        pools = list(_ASYNC_POOLS.items())
+        _ASYNC_POOLS.clear()
+    for async_mode, pool in pools:
+        if async_mode == 'process':
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+
+
+def _library_call(library_func, cache_results, key_func=None):
+    """The callable the compute of a generated module calls
+
+    The cached results are keyed on `key_func` (see
+    `result_cache.cached_call`), which defaults to `library_func`
+    """
+    if not cache_results:
+        return library_func
+
+    @functools.wraps(library_func)
+    def call(*args, **kwargs):
+        return cached_call(library_func, args, kwargs, key_func=key_func)
+    return call
+
+
+def _binding_plan(input_ports, dict_port=None, coercions=None,
+                  module_name=None):
+    """Resolve how the input ports of a module bind to its library function
+
+    Parameters
+    ----------
+    input_ports : list
+        List of IPort objects
+    dict_port : IPort, optional
+        The convenience dictionary port, which is left out of the plan
+    coercions : dict, optional
+        The 'coerce' entry of the port dictionaries, keyed on port name
+    module_name : str, optional
+        Name of the module the coercions are reported under
+
+    Returns
+    -------
+    plan : tuple
+        One (port_name, mandatory, coerce) tuple per port, optional ports
+        first.  `coerce` is None or a callable converting the port values.
+    """
+    if coercions is None:
+        coercions = {}
+    optional = []
+    mandatory = []
+    for port in input_ports:
+        if port == dict_port:
+            # since dict port must be in the input_ports list but we dont want
+            # to treat it as a normal input port, do not assign it as
+            # optional or mandatory
+            continue
+        coerce = coercions.get(port.name)
+        if coerce is not None:
+            coerce = functools.partial(
+                _COERCE_FUNCS[coerce],
+                '{0}.{1}'.format(module_name, port.name))
+        if port.optional:
+            optional.append((port.name, False, coerce))
+        else:
+            mandatory.append((port.name, True, coerce))
+    return tuple(optional + mandatory)
+
+
+def _vt_port_args(pdict):
+    """The keyword arguments of IPort in a scraped port dictionary
+    """
+    if 'coerce' not in pdict:
+        return pdict
+    return dict((key, val) for key, val in six.iteritems(pdict)
+                if key != 'coerce')
+
+
+def _coerce_array(report_name, val):
+    """Convert the value of an 'array' port to a C-contiguous ndarray
+
+    Contiguous ndarrays are passed as-is (no copy), lists and tuples of
+    numbers and non-contiguous ndarrays are converted.  Anything else
+    (scalars, None, ndarray subclasses, ragged lists) is left alone, so
+    the library function sees what it would have seen without coercion.
+    The outcome is counted in `profiling.coercion_report`.
+    """
+    if isinstance(val, np.ndarray):
+        if val.flags.c_contiguous:
+            record_coercion(report_name, 'passthrough')
+            return val
+        if type(val) is not np.ndarray:
+            # ascontiguousarray would drop the subclass (masks...)
+            record_coercion(report_name, 'skipped')
+            return val
+        record_coercion(report_name, 'converted')
+        return np.ascontiguousarray(val)
+    if not isinstance(val, (list, tuple)):
+        record_coercion(report_name, 'skipped')
+        return val
+    try:
+        arr = np.ascontiguousarray(val)
+    except (TypeError, ValueError):
+        arr = None
+    if arr is None or arr.dtype.hasobject:
+        record_coercion(report_name, 'failed')
+        return val
+    record_coercion(report_name, 'converted')
+    return arr
+
+
 def gen_module_ufunc(input_ports, output_ports, docstring,
                module_name, library_func, module_namespace,
-               dict_port=None):
+               dict_port=None, cache_results=False, map_ports=None,
+               map_workers=None, reuse_output=False, chunk_workers=1):
+    """
+    Generate the VisTrails module of a numpy ufunc
+
+    See `gen_module` for the parameters, `dict_port` and `map_ports` are
+    not supported.
+
+    Parameters
+    ----------
+    reuse_output : bool, optional
+        Keep the output array(s) of the last execution of a module and
+        write its next result into them (through the ``out`` argument of
+        the ufunc) when the broadcast shape and the output types the
+        ufunc resolves for the inputs are the same.  The buffers are kept
+        per module of a pipeline, so that they outlive the module
+        instances VisTrails creates for each execution.  This also adds
+        an optional 'out' input port taking caller owned output array(s).
+        The previous output is overwritten, so downstream modules must
+        not hold on to it.
+
+    chunk_workers : int, optional
+        Number of threads evaluating large inputs block by block along
+        their leading axis, see `_chunked_ufunc`.  1 (the default) always
+        evaluates the ufunc in one go, None uses one thread per CPU
+    """
     if dict_port is not None:
         raise NotImplementedError("Dict_port is not supported for ufuncs")
+    if map_ports:
+        # ufuncs broadcast over stacked arrays already
+        raise NotImplementedError("Map mode is not supported for ufuncs")
+    if reuse_output and cache_results:
+        raise ValueError("The reused output buffers would overwrite the "
+                         "cached results")
     # can't unpack dicts into ufuncs, assume all are
-    # mandatory
-    input_ports = [IPort(**pdict) for pdict in input_ports]
+    # mandatory.  The ufunc converts its inputs itself, so the
+    # coercions are not applied
+    input_ports = [IPort(**_vt_port_args(pdict)) for pdict in input_ports]
     output_ports = [OPort(**pdict) for pdict in output_ports]
 
     mandatory = input_ports
@@ -179,12 +583,52 @@ def gen_module_ufunc(input_ports, output_ports, docstring,
                          "ufunc should have {} out".format(library_func.nout) +
                          " parsing docstring has {}".format(len(output_ports)))
 
+    if reuse_output:
+        input_ports.append(IPort(name='out', signature='basic:Variant',
+                                 optional=True,
+                                 label='Array(s) to write the output to'))
+    if chunk_workers != 1:
+        # the chunked calls give the results of the ufunc
+        call = _library_call(_chunked_ufunc(library_func, chunk_workers),
+                             cache_results, key_func=library_func)
+    else:
+        call = _library_call(library_func, cache_results)
+    # the output buffers of the modules of this type in the pipelines,
+    # see `_pipeline_module_key`
+    out_buffers = {}
+
     def compute(self):
         args = list()
         for arg_name in arg_names:
             args.append(self.get_input(arg_name))
 
-        ret = library_func(*args)
+        if not reuse_output:
+            ret = call(*args)
+        elif self.has_input('out'):
+            out = self.get_input('out')
+            if library_func.nout > 1:
+                out = tuple(out)
+            ret = call(*args, out=out)
+        else:
+            # the output of the last execution of this module, keyed on
+            # `_out_buffer_key`.  Other modules wrapping the same ufunc
+            # have their own
+            module_key = _pipeline_module_key(self)
+            if module_key is None:
+                out_buffer = self.__dict__.setdefault('_out_buffer', {})
+            else:
+                out_buffer = out_buffers.setdefault(module_key, {})
+            key = _out_buffer_key(library_func, args)
+            if key is not None and key in out_buffer:
+                ret = call(*args, out=out_buffer[key])
+            else:
+                ret = call(*args)
+                out_buffer.clear()
+                if key is not None:
+                    if library_func.nout == 1:
+                        out_buffer[key] = ret
+                    else:
+                        out_buffer[key] = tuple(ret)
         if len(output_ports) == 1:
             self.set_output(output_ports[0].name, ret)
         else:
@@ -192,18 +636,243 @@ def gen_module_ufunc(input_ports, output_ports, docstring,
                 self.set_output(out_port.name, ret_val)
 
     _settings = ModuleSettings(namespace=module_namespace)
+    # no-op unless the execution profiling is enabled
+    compute = profile_compute(_VT_SEP.join([module_namespace, module_name]),
+                              compute)
 
-    new_class = type(str(module_name),
-                     (Module,), {'compute': compute,
-                                 '__module__': __name__,
-                                 '_settings': _settings,
-                                 '__doc__': docstring,
-                                 '__name__': module_name,
-                                 '_input_ports': input_ports,
-                                 '_output_ports': output_ports})
+    class_dict = {'compute': compute,
+                  '__module__': __name__,
+                  '_settings': _settings,
+                  '__name__': module_name,
+                  '_input_ports': input_ports,
+                  '_output_ports': output_ports,
+                  '_ufunc': library_func}
+    class_dict.update(_doc_attrs(docstring))
+    new_class = type(str(module_name), (Module,), class_dict)
     return new_class
 
 
+def fuse_ufunc_modules(chain, module_name, module_namespace,
+                       use_numexpr=True):
+    """Generate one VisTrails module evaluating a chain of ufunc modules
+
+    The modules of `chain` must have been generated by `gen_module_ufunc`.
+    The fused module evaluates their ufuncs as one expression (see
+    `fusion.FusedUfunc`) so that the intermediate arrays are never
+    materialized.  Its input ports are the inputs of the steps that are
+    not fed by the previous step, named '<ufunc><step>_<port>', and its
+    output port is the output port of the last module.  See
+    `fusion.find_ufunc_chains` to find the chains of a workflow.
+
+    Parameters
+    ----------
+    chain : list
+        (module class, linked port) of each step.  The linked port is the
+        name of the input port fed by the output of the previous step, it
+        is ignored for the first step
+
+    module_name : str
+        The name of the fused module
+
+    module_namespace : str
+        Vistrails namespace to use
+
+    use_numexpr : bool, optional
+        See `fusion.FusedUfunc`
+
+    Returns
+    -------
+    fused_module : type
+    """
+    steps = []
+    input_ports = []
+    port_names = []
+    for idx, (module_class, linked_port) in enumerate(chain):
+        ufunc = getattr(module_class, '_ufunc', None)
+        if ufunc is None:
+            raise ValueError('{0} is not a wrapped ufunc'
+                             ''.format(module_class.__name__))
+        operands = []
+        for port in module_class._input_ports[:ufunc.nin]:
+            if idx > 0 and port.name == linked_port:
+                operands.append(idx - 1)
+                continue
+            name = '{0}{1}_{2}'.format(ufunc.__name__, idx, port.name)
+            operands.append(name)
+            port_names.append(name)
+            input_ports.append(IPort(name=name, signature=port.signature))
+        if idx > 0 and idx - 1 not in operands:
+            raise ValueError('{0} has no input port {1}'
+                             ''.format(module_class.__name__, linked_port))
+        steps.append((ufunc, operands))
+    fused = FusedUfunc(steps, use_numexpr=use_numexpr)
+    output_ports = [OPort(name=chain[-1][0]._output_ports[0].name,
+                          signature='basic:Variant')]
+
+    def compute(self):
+        self.set_output(output_ports[0].name,
+                        fused(**dict((name, self.get_input(name))
+                                     for name in port_names)))
+
+    compute = profile_compute(_VT_SEP.join([module_namespace, module_name]),
+                              compute)
+    class_dict = {'compute': compute,
+                  '__module__': __name__,
+                  '_settings': ModuleSettings(namespace=module_namespace),
+                  '__name__': module_name,
+                  '__doc__': 'Evaluates {0!r} in one pass'.format(fused),
+                  '_input_ports': input_ports,
+                  '_output_ports': output_ports,
+                  '_fused': fused}
+    return type(str(module_name), (Module,), class_dict)
+
+
+def _chunked_ufunc(ufunc, workers=None):
+    """Evaluate `ufunc` on a thread pool, block by block
+
+    Calls whose broadcast inputs have at least `_CHUNK_MIN_SIZE` elements
+    are split along the leading axis into blocks of about `_CHUNK_BYTES`
+    per input (so that a block stays in the CPU cache).  The first block
+    is evaluated serially to learn the output types, the others on
+    `workers` threads (numpy releases the GIL in the ufunc loops), all of
+    them writing into the same output array(s).  Smaller calls, and calls
+    that fit in one block, go straight to `ufunc`.
+
+    Parameters
+    ----------
+    ufunc : numpy.ufunc
+        The ufunc to call
+    workers : int, optional
+        Number of threads, defaults to the number of CPUs
+
+    Returns
+    -------
+    chunked : callable
+        Takes the inputs of `ufunc` and an optional `out` keyword argument
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    @functools.wraps(ufunc)
+    def chunked(*args, **kwargs):
+        out = kwargs.pop('out', None)
+        if kwargs:
+            raise TypeError('unexpected keyword arguments {0}'
+                            ''.format(sorted(kwargs)))
+        args = [np.asarray(arg) for arg in args]
+        bcast = np.broadcast(*args)
+        shape = bcast.shape
+        bounds = []
+        if bcast.size >= _CHUNK_MIN_SIZE and shape[0] > 1 and workers > 1:
+            row_bytes = (bcast.size // shape[0] *
+                         max(arg.itemsize for arg in args))
+            rows = max(1, _CHUNK_BYTES // row_bytes)
+            bounds = [(start, min(start + rows, shape[0]))
+                      for start in range(0, shape[0], rows)]
+        if len(bounds) < 2:
+            # small inputs, or inputs that fit in one block
+            if out is None:
+                return ufunc(*args)
+            return ufunc(*args, out=out)
+
+        def block_args(start, stop):
+            # only the inputs spanning the leading axis are split, the
+            # others broadcast against each block
+            return [arg[start:stop] if arg.ndim == len(shape) and
+                    arg.shape[0] == shape[0] else arg
+                    for arg in args]
+
+        start, stop = bounds[0]
+        first = ufunc(*block_args(start, stop))
+        if ufunc.nout == 1:
+            first = (first, )
+        if out is None:
+            out = tuple(np.empty(shape, dtype=res.dtype) for res in first)
+        elif not isinstance(out, tuple):
+            out = (out, )
+        for res, arr in zip(first, out):
+            arr[start:stop] = res
+
+        def run_block(bound):
+            start, stop = bound
+            ufunc(*block_args(start, stop),
+                  out=tuple(arr[start:stop] for arr in out))
+
+        pool = ThreadPool(min(workers, len(bounds) - 1))
+        try:
+            pool.map(run_block, bounds[1:])
+        finally:
+            pool.close()
+            pool.join()
+        if ufunc.nout == 1:
+            return out[0]
+        return out
+
+    return chunked
+
+
+def _out_buffer_key(ufunc, args):
+    """Key under which the output buffer of a ufunc call is kept
+
+    The key is the broadcast shape and the output types of the call.
+    These are resolved by calling the ufunc on (at most) one element of
+    each array input, scalars are passed whole since they take part in
+    the type resolution through their value (``np.add(int8_arr, 200)``
+    gives int16).
+
+    Returns None for calls whose output is a scalar or whose types could
+    not be resolved.
+    """
+    shape = np.broadcast(*args).shape
+    if not shape:
+        return None
+    probe = [arg.reshape(-1)[:1] if isinstance(arg, np.ndarray) else arg
+             for arg in args]
+    try:
+        res = ufunc(*probe)
+    except Exception:
+        # the real call reports it
+        return None
+    if ufunc.nout == 1:
+        res = (res, )
+    return shape, tuple(np.asarray(r).dtype for r in res)
+
+
+def _pipeline_module_key(module):
+    """Key of a module instance in its pipeline
+
+    VisTrails creates new module instances when a pipeline is executed
+    again, the vistrail name and the module id identify the module
+    across these.  Returns None for instances outside of a pipeline.
+    """
+    info = getattr(module, 'moduleInfo', None) or {}
+    module_id = info.get('moduleId')
+    if module_id is None or module_id < 0:
+        return None
+    return info.get('vistrailName'), module_id
+
+
+def _doc_attrs(docstring):
+    """Class attributes that document a generated module
+
+    A `scrape.DeferredSource` docstring is only resolved when VisTrails
+    asks for the documentation of the module (through the
+    `get_documentation` hook), and then remembered.
+    """
+    if not isinstance(docstring, DeferredSource):
+        return {'__doc__': docstring}
+
+    resolved = []
+
+    def get_documentation(cls, doc, module=None):
+        if not resolved:
+            resolved.append(docstring.resolve())
+        return resolved[0]
+
+    return {'__doc__': None,
+            'get_documentation': classmethod(get_documentation)}
+
+
 def normalize_name_space(namespace):
     """Clean up namespace paths
 
@@ -238,7 +907,9 @@ def normalize_name_space(namespace):
 
 def wrap_function(func_name, module_path, input_ports, output_ports,
                   doc_string, f_type,
-                  add_input_dict=False, namespace=None):
+                  add_input_dict=False, namespace=None, cache_results=False,
+                  map_ports=None, map_workers=None, reuse_output=False,
+                  chunk_workers=1, async_mode=None):
     """Perform the wrapping of functions into VisTrails modules
 
     Parameters
@@ -262,6 +933,30 @@ def wrap_function(func_name, module_path, input_ports, output_ports,
         by vertical bars: |.  Example: 'vis|test' will put the new VisTrail
         module at the end of expandable lists vis -> test -> func_name
         currently supports separations by '|' and '.'
+
+    cache_results : bool, optional
+        Reuse the results of earlier executions with the same inputs, see
+        `vttools.result_cache`
+
+    map_ports : list, optional
+        Names of input ports that also accept a list of values (on a
+        '<name>_list' port), the function being applied to each of them.
+        See `gen_module`
+
+    map_workers : int, optional
+        Number of threads used in map mode, defaults to the number of CPUs
+
+    reuse_output : bool, optional
+        Ufuncs only, write the output into the array of the previous
+        execution when possible.  See `gen_module_ufunc`
+
+    chunk_workers : int, optional
+        Ufuncs only, number of threads evaluating large inputs block by
+        block.  See `gen_module_ufunc`
+
+    async_mode : {None, 'thread', 'process'}, optional
+        Functions only, run the function on a worker thread or process
+        without blocking the GUI.  See `gen_module`
     """
     # list common separators for the namespace argument
 
@@ -288,6 +983,20 @@ def wrap_function(func_name, module_path, input_ports, output_ports,
     else:
         dict_port = None
 
+    # options that only one of the generators knows about
+    gen_kwargs = {}
+    for key, val, default in (('reuse_output', reuse_output, False),
+                              ('chunk_workers', chunk_workers, 1)):
+        if val != default:
+            if f_type != 'ufunc':
+                raise ValueError('{0} is only supported for ufuncs'
+                                 ''.format(key))
+            gen_kwargs[key] = val
+    if async_mode is not None:
+        if f_type != 'func':
+            raise ValueError('async_mode is not supported for ufuncs')
+        gen_kwargs['async_mode'] = async_mode
+
     # look up the callable object
     mod = importlib.import_module(module_path)
     func = getattr(mod, func_name)
@@ -298,19 +1007,141 @@ def wrap_function(func_name, module_path, input_ports, output_ports,
                                                 module_name=func_name,
                                                 module_namespace=namespace,
                                                 library_func=func,
-                                                dict_port=dict_port)
+                                                dict_port=dict_port,
+                                                cache_results=cache_results,
+                                                map_ports=map_ports,
+                                                map_workers=map_workers,
+                                                **gen_kwargs)
 
+    elapsed = time.time() - t1
+    record_startup(module_path, 'wrap', elapsed, func_name)
     logger.info('func_name {0}, module_name {1}. Time: {2}'
-                ''.format(func_name, module_path, format(time.time() - t1)))
+                ''.format(func_name, module_path, format(elapsed)))
     return generated_module
 
 
-def wrap_class(class_name, module_path, add_input_dict=False, namespace=None):
-    raise NotImplementedError("wrap_class is not implemented yet. "
-                              "Go yell at Eric...")
+def wrap_class(class_name, module_path, add_input_dict=False, namespace=None,
+               methods=None, cache_instances=False):
+    """Wrap a class into VisTrails modules
+
+    The constructor becomes a module named after the class, with an
+    'instance' output port.  Each method becomes a module (in the
+    '<namespace>|<class_name>' namespace) with an 'instance' input port,
+    the scraped method ports and, after the scraped output ports, an
+    'instance' output port for chaining method calls.
+
+    Parameters
+    ----------
+    class_name : str
+        Name of the class to wrap into VisTrails. Example 'GaussianModel'
+
+    module_path : str
+        Name of the module which contains the class
+
+    add_input_dict : bool, optional
+        Add a dictionary input port to the constructor module, see
+        `wrap_function`
+
+    namespace : str, optional
+        Path to the modules in VisTrails, see `wrap_function`
+
+    methods : list, optional
+        Names of the methods to wrap.  Defaults to the public methods
+        listed by numpydoc
+
+    cache_instances : bool, optional
+        Re-use the instance built by an earlier execution when the
+        constructor arguments are unchanged (through the
+        `vttools.result_cache`), so that costly setup is done once.
+        Defaults to False.  The re-used instance is shared by the
+        executions: the changes made by methods that modify it carry over
+        to the next execution.  The cache sizes instances with
+        `sys.getsizeof`, so the memory they hold on to is not bounded by
+        the cache budget.
+
+    Returns
+    -------
+    vt_modules : list
+        The constructor module followed by the method modules
+    """
+    if namespace is None:
+        namespace = module_path
+    namespace = normalize_name_space(namespace)
+    t1 = time.time()
+
+    spec = scrape_class(class_name, module_path, methods=methods)
+    cls = getattr(importlib.import_module(module_path), class_name)
+
+    input_ports = list(spec['constructor']['input_ports'])
+    if add_input_dict:
+        dict_port = dict(name='input_dict', signature=('basic:Dictionary'),
+                         label='Dictionary of input parameters.'
+                               'Convienence port')
+        input_ports.append(dict_port)
+    else:
+        dict_port = None
+    vt_modules = [gen_module(input_ports=input_ports,
+                             output_ports=[_INSTANCE_PORT],
+                             docstring=spec['constructor']['doc_string'],
+                             module_name=class_name,
+                             library_func=cls,
+                             module_namespace=namespace,
+                             dict_port=dict_port,
+                             cache_results=cache_instances)]
+
+    method_namespace = _VT_SEP.join([namespace, class_name])
+    for method_name, method_spec in sorted(six.iteritems(spec['methods'])):
+        output_ports = method_spec['output_ports']
+        vt_modules.append(gen_module(
+            input_ports=[dict(_INSTANCE_PORT, label='The {0} instance'
+                                                    ''.format(class_name))] +
+            method_spec['input_ports'],
+            output_ports=output_ports + [_INSTANCE_PORT],
+            docstring=method_spec['doc_string'],
+            module_name=method_name,
+            library_func=_method_call(method_name, len(output_ports)),
+            module_namespace=method_namespace))
+
+    elapsed = time.time() - t1
+    record_startup(module_path, 'wrap', elapsed, class_name)
+    logger.info('class_name {0}, module_name {1}. Time: {2}'
+                ''.format(class_name, module_path, format(elapsed)))
+    return vt_modules
+
+
+def _method_call(method_name, n_out):
+    """Library function of a method module
+
+    Returns a callable taking the instance and the method arguments and
+    returning the output(s) of the method followed by the instance
+    """
+    def call(instance, **kwargs):
+        ret = getattr(instance, method_name)(**kwargs)
+        if n_out == 0:
+            return instance
+        if n_out == 1:
+            return ret, instance
+        return tuple(ret) + (instance, )
+    call.__name__ = str(method_name)
+    return call
 
 
+# converters of the 'coerce' entry of the scraped port dictionaries
+_COERCE_FUNCS = {'array': _coerce_array}
+# port passing the instances of wrapped classes around
+_INSTANCE_PORT = {'name': 'instance', 'signature': 'basic:Variant'}
 _GEN_MOD_LOOKUP = {'func': gen_module,
                    'ufunc': gen_module_ufunc}
 _NAMESPACE_SEPS = ('.', )
+_ASYNC_MODES = (None, 'thread', 'process')
+# seconds between two progress reports of an asynchronous call
+_ASYNC_POLL_INTERVAL = 0.1
+# async_mode -> worker pool, see `_async_pool`
+_ASYNC_POOLS = {}
+_ASYNC_POOLS_LOCK = threading.Lock()
+atexit.register(_shutdown_async_pools)
+# inputs smaller than this (number of elements) are not chunked
+_CHUNK_MIN_SIZE = 2 ** 20
+# bytes of each input per block of a chunked ufunc call
+_CHUNK_BYTES = 2 ** 21
 _VT_SEP = '|'